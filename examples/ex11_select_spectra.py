@@ -0,0 +1,35 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to read only a few spectra from a    #
+# mapping file without loading the whole DATA block          #
+##############################################################
+
+import numpy as np
+from renishawWiRE import WDFReader
+from _path import curdir
+
+
+def main():
+    filename = curdir / "spectra_files" / "mapping.wdf"
+    reader = WDFReader(filename)
+    assert reader.measurement_type == 3
+    w, h = reader.map_shape
+    # Single spectrum, by flat index
+    sp = reader.read_spectra(0)
+    assert sp.shape == (reader.point_per_spectrum,)
+    # Several spectra by index list, neighbouring indices are read together
+    sps = reader.read_spectra([0, 1, 2, reader.count - 1])
+    assert sps.shape == (4, reader.point_per_spectrum)
+    # A window of (row, col) on the mapping grid
+    window = reader.read_spectra((slice(0, 2), slice(0, 3)))
+    assert window.shape == (min(h, 2), min(w, 3), reader.point_per_spectrum)
+    # Nothing has been loaded yet, compare with the full spectra
+    spectra = reader.spectra
+    assert np.all(window == spectra[:2, :3])
+    reader.close()
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example compares the text writer of wdf-export with    #
+# numpy.savetxt, checks that the outputs are identical and   #
+# that fixed-point formats are written faster                #
+##############################################################
+
+import time
+import filecmp
+import tempfile
+import numpy as np
+from renishawWiRE import WDFReader
+from renishawWiRE.export import handle_spectra, write_text
+from pathlib import Path
+from _path import curdir
+
+
+def bench(func, output, X, fmt, header, repeat=3):
+    """Best throughput of `repeat` runs in MB/s"""
+    dt = float("inf")
+    for i in range(repeat):
+        t = time.perf_counter()
+        func(output, X, fmt=fmt, delimiter=",", header=header)
+        dt = min(dt, time.perf_counter() - t)
+    return output.stat().st_size / dt / 1e6
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        compare(Path(tmpdir))
+
+
+def compare(tmpdir):
+    filename = curdir / "spectra_files" / "mapping.wdf"
+    reader = WDFReader(filename)
+    X, header = handle_spectra(reader, delimiter=",")
+    # Make the matrix larger, about 2 million values
+    X = np.tile(X, (1, max(1, 2000000 // X.size)))
+    # Only fixed-point formats are vectorized, others run at about the
+    # speed of np.savetxt
+    for fmt, min_speedup in (("%.4f", 1.0), ("%10.3f", 1.0), ("%.6e", 0.5)):
+        out_numpy = tmpdir / "bench_savetxt.csv"
+        out_fast = tmpdir / "bench_write_text.csv"
+        speed_numpy = bench(np.savetxt, out_numpy, X, fmt, header)
+        speed_fast = bench(write_text, out_fast, X, fmt, header)
+        print(
+            "{0}: np.savetxt {1:.1f} MB/s, write_text {2:.1f} MB/s".format(
+                fmt, speed_numpy, speed_fast
+            )
+        )
+        assert filecmp.cmp(out_numpy, out_fast, shallow=False)
+        assert speed_fast >= min_speedup * speed_numpy
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to scan the headers of many files    #
+# without parsing their blocks, and how unreadable files     #
+# are reported instead of stopping the scan                  #
+##############################################################
+
+import tempfile
+from pathlib import Path
+from renishawWiRE import WDFReader, read_header, read_headers
+from _path import curdir
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        scan_headers(Path(tmpdir))
+
+
+def scan_headers(tmpdir):
+    filenames = [
+        curdir / "spectra_files" / "{0}.wdf".format(name)
+        for name in ("sp", "line", "mapping")
+    ]
+    # A broken file in the middle of the list
+    broken = tmpdir / "broken.wdf"
+    broken.write_bytes(b"not a wdf file")
+    files = filenames[:1] + [broken] + filenames[1:]
+
+    results = dict(read_headers(files, errors="return"))
+    assert len(results) == len(files)
+    assert isinstance(results[broken], ValueError)
+    for filename in filenames:
+        header = results[filename]
+        assert header == read_header(filename)
+        reader = WDFReader(filename)
+        for key in ("count", "capacity", "point_per_spectrum", "title"):
+            assert header[key] == getattr(reader, key)
+        assert header["scan_type"] == reader.scan_type
+        assert header["measurement_type"] == reader.measurement_type
+        reader.close()
+
+    # Broken files can also be left out
+    names = [name for name, header in read_headers(files, errors="skip")]
+    assert names == filenames
+    # Or raise, the default
+    try:
+        list(read_headers(files))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("The broken file was not detected")
+
+
+if __name__ == "__main__":
+    main()
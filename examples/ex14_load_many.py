@@ -0,0 +1,37 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to load many files in parallel into  #
+# one stacked array of spectra                               #
+##############################################################
+
+import numpy as np
+from renishawWiRE import WDFReader, load_many
+from _path import curdir
+
+
+def main():
+    filename = curdir / "spectra_files" / "mapping.wdf"
+    reader = WDFReader(filename)
+    pps = reader.point_per_spectrum
+    expected = np.reshape(reader.spectra, (-1, pps))
+    # The same file several times, all files need the same point_per_spectrum
+    filenames = [filename] * 3
+    for executor in ("thread", "process"):
+        stacked = load_many(filenames, workers=2, executor=executor)
+        assert len(stacked) == 3
+        assert stacked.spectra.shape == (3 * reader.count, pps)
+        assert list(stacked.offsets) == [i * reader.count for i in range(4)]
+        for i in range(3):
+            assert np.array_equal(stacked.file_spectra(i), expected)
+            assert stacked.metadata[i]["count"] == reader.count
+        # Identical x-axis are shared
+        assert stacked.xdata[0] is stacked.xdata[2]
+        assert np.array_equal(stacked.xdata[0], reader.xdata)
+        assert np.array_equal(stacked.positions["file_index"][-1], 2)
+        assert np.allclose(stacked.positions["x"][: reader.count], reader.xpos)
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to index the spectra of several      #
+# files as one virtual array                                 #
+##############################################################
+
+import numpy as np
+from renishawWiRE import WDFReader, WDFDataset
+from _path import curdir
+
+
+def main():
+    filename = curdir / "spectra_files" / "mapping.wdf"
+    reader = WDFReader(filename)
+    pps = reader.point_per_spectrum
+    spectra = np.reshape(reader.spectra, (-1, pps))
+    n = reader.count
+
+    dataset = WDFDataset([filename, filename])
+    assert dataset.shape == (2 * n, pps)
+    assert list(dataset.offsets) == [0, n, 2 * n]
+    # Slices and index lists can span both files
+    assert np.array_equal(dataset[n - 2 : n + 2], spectra[[n - 2, n - 1, 0, 1]])
+    assert np.array_equal(dataset[[0, n]], spectra[[0, 0]])
+    assert np.array_equal(dataset[-1], spectra[-1])
+    assert np.array_equal(dataset[:3, 5:10], spectra[:3, 5:10])
+    assert np.array_equal(np.asarray(dataset)[n:], spectra)
+    assert np.array_equal(dataset.file_index, np.repeat([0, 1], n))
+    assert np.array_equal(dataset.xpos[n:], reader.xpos)
+    assert np.array_equal(dataset.ypos[:n], reader.ypos)
+
+    # Time is measured from the earliest start of all files, here both
+    # files start at the same time
+    if reader.start_time is not None:
+        assert np.all(dataset.start_times == reader.start_time)
+        assert np.allclose(dataset.time[:n], reader.origin_list["Time"])
+        assert np.allclose(dataset.time[n:], reader.origin_list["Time"])
+    dataset.close()
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
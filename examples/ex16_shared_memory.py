@@ -0,0 +1,48 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to share the spectra of a file with  #
+# worker processes without copying them                      #
+##############################################################
+
+import os
+import pickle
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from renishawWiRE import WDFReader
+from _path import curdir
+
+
+def row_sum(handle, row):
+    # Workers attach the segments and only close them
+    with handle.attach() as data:
+        return float(data.spectra[row].sum()), float(data.xpos.sum())
+
+
+def main():
+    filename = curdir / "spectra_files" / "mapping.wdf"
+    reader = WDFReader(filename)
+    spectra = reader.spectra
+    with reader.to_shared_memory() as shared:
+        assert np.array_equal(shared.spectra, spectra)
+        assert np.array_equal(shared.xdata, reader.xdata)
+        assert np.array_equal(shared.xpos, reader.xpos)
+        handle = pickle.loads(pickle.dumps(shared.handle))
+        rows = list(range(spectra.shape[0]))
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(row_sum, [handle] * len(rows), rows))
+        for row, (total, xpos) in zip(rows, results):
+            assert np.isclose(total, spectra[row].sum())
+            assert np.isclose(xpos, reader.xpos.sum())
+        # The segments outlive the workers
+        assert np.array_equal(shared.spectra, spectra)
+        segments = [spec[0] for spec in shared.handle.specs.values()]
+    # The owner frees the memory on exit
+    if os.path.isdir("/dev/shm"):
+        for name in segments:
+            assert not os.path.exists(os.path.join("/dev/shm", name.lstrip("/")))
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
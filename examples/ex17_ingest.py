@@ -0,0 +1,74 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to ingest the wdf files of a folder  #
+# into a sink as they appear                                 #
+##############################################################
+
+import shutil
+import tempfile
+import numpy as np
+from renishawWiRE import WDFReader, Ingest
+from renishawWiRE.ingest import NpzSink, Sink
+from pathlib import Path
+from _path import curdir
+
+
+class Collect(Sink):
+    """Keep the spectra of each file and forward to a NpzSink"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.spectra = {}
+        self.finished = []
+
+    def update(self, name, reader, start, spectra):
+        if start == 0:
+            self.spectra[name] = []
+        self.spectra[name].append(spectra)
+        self.sink.update(name, reader, start, spectra)
+
+    def finish(self, name, reader):
+        self.finished.append(name)
+        self.sink.finish(name, reader)
+
+    def close(self):
+        self.sink.close()
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ingest_folder(Path(tmpdir))
+
+
+def ingest_folder(tmpdir):
+    root = tmpdir / "ingest"
+    output = tmpdir / "ingest_npz"
+    (root / "maps").mkdir(parents=True)
+    names = ["sp.wdf", "maps/mapping.wdf"]
+    for name in names:
+        shutil.copy(curdir / "spectra_files" / name.split("/")[-1], root / name)
+    (root / "notes.txt").write_text("not a wdf file")
+
+    sink = Collect(NpzSink(output))
+    # Small chunks, each file is passed to the sink in several updates
+    with Ingest(root, sink, workers=2, chunk_size=7) as ingest:
+        assert ingest.poll() == len(names)
+    assert ingest.errors == {}
+    assert sorted(sink.finished) == sorted(names)
+
+    for name in names:
+        reader = WDFReader(root / name)
+        pps = reader.point_per_spectrum
+        expected = np.reshape(reader.spectra, (-1, pps))
+        assert np.array_equal(np.concatenate(sink.spectra[name]), expected)
+        with np.load((output / name).with_suffix(".npz")) as npz:
+            assert np.array_equal(np.reshape(npz["spectra"], (-1, pps)), expected)
+            assert np.array_equal(npz["xdata"], reader.xdata)
+            if "ORGN" in reader.block_info:
+                assert np.array_equal(npz["origin_list"], reader.origin_list)
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
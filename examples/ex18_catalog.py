@@ -0,0 +1,51 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to keep the metadata of many files   #
+# in a SQLite catalog and query it                           #
+##############################################################
+
+from renishawWiRE import Catalog
+from renishawWiRE.types import MeasurementType
+from _path import curdir
+
+
+def main():
+    folder = (curdir / "spectra_files").resolve()
+    filenames = sorted(str(p) for p in folder.glob("*.wdf"))
+    with Catalog(":memory:") as catalog:
+        n_updated, errors = catalog.update(folder, workers=2)
+        assert errors == {}
+        assert n_updated == len(catalog) == len(filenames)
+        # Unchanged files are not parsed again
+        assert catalog.update(folder) == (0, {})
+
+        entries = catalog.query()
+        assert [entry.path for entry in entries] == filenames
+        for entry in entries:
+            reader = entry.open()
+            assert entry.count == reader.count
+            assert entry.point_per_spectrum == reader.point_per_spectrum
+            assert entry.scan_type == reader.scan_type.name
+            assert catalog.blocks(entry.path) == sorted(
+                reader.block_table, key=lambda block: block[2]
+            )
+            if "WMAP" in reader.block_info:
+                assert entry.map_shape == tuple(reader.map_shape)
+                assert entry.map_info["x_unit"] == reader.map_info["x_unit"].name
+            else:
+                assert entry.map_shape is None
+            reader.close()
+
+        mappings = catalog.query(
+            measurement_type=MeasurementType.Mapping, min_count=2
+        )
+        assert len(mappings) > 0
+        for entry in mappings:
+            assert entry.measurement_type == "Mapping"
+            assert entry.count >= 2
+        assert catalog.query(where="count < 0") == []
+
+
+if __name__ == "__main__":
+    main()
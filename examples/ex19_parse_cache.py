@@ -0,0 +1,68 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to cache the parsed blocks of files  #
+# that are opened often                                      #
+##############################################################
+
+import tempfile
+import numpy as np
+from renishawWiRE import WDFReader
+from renishawWiRE.cache import ParseCache
+from pathlib import Path
+from _path import curdir
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        use_cache(Path(tmpdir) / "cache")
+
+
+def use_cache(directory):
+    filename = curdir / "spectra_files" / "mapping.wdf"
+    cache = ParseCache(directory)
+    reference = WDFReader(filename)
+
+    # The first open parses and stores, the second loads from the cache
+    for i in range(2):
+        reader = WDFReader(filename, cache=cache)
+        assert np.array_equal(reader.xdata, reference.xdata)
+        assert np.array_equal(reader.xpos, reference.xpos)
+        assert np.array_equal(reader.ypos, reference.ypos)
+        assert np.array_equal(reader.origin_list, reference.origin_list)
+        for header, ref_header in zip(
+            reader.origin_list_header, reference.origin_list_header
+        ):
+            assert header[:4] == ref_header[:4]
+            assert np.array_equal(header[4], ref_header[4])
+        assert reader.start_time == reference.start_time
+        assert reader.map_shape == reference.map_shape
+        assert np.array_equal(reader.spectra, reference.spectra)
+        reader.close()
+    entries = cache.entries()
+    assert len(entries) == 1
+    # Spectra are read from the wdf file, not stored in the cache
+    files = [p.name for p in directory.glob("*/*")]
+    assert not any(name.startswith("DATA") for name in files)
+    assert "ORGN.origin_list.npy" in files
+
+    # Least recently used files are evicted when the cache is full
+    full = ParseCache(directory, max_bytes=entries[0][1])
+    reader = WDFReader(curdir / "spectra_files" / "line.wdf", cache=full)
+    reader.origin_list
+    reader.close()
+    assert len(full.entries()) == 1
+    assert full.entries()[0][2] != entries[0][2]
+
+    # Blocks larger than the cache are not stored
+    cache.clear()
+    small = ParseCache(directory, max_bytes=16)
+    reader = WDFReader(filename, cache=small)
+    assert np.array_equal(reader.origin_list, reference.origin_list)
+    reader.close()
+    assert not any(p.name.startswith("ORGN") for p in directory.glob("*/*"))
+    reference.close()
+
+
+if __name__ == "__main__":
+    main()
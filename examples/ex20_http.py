@@ -0,0 +1,97 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to read a file from an HTTP server   #
+# with range requests, here a local server is started        #
+##############################################################
+
+import re
+import threading
+import numpy as np
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from renishawWiRE import WDFReader
+from renishawWiRE.source import HTTPSource
+from _path import curdir
+
+
+class RangeHandler(SimpleHTTPRequestHandler):
+    """Serve files with support of `Range: bytes=a-b`, log the ranges"""
+
+    ranges = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        match = re.match(r"bytes=(\d+)-(\d+)$", self.headers.get("Range", ""))
+        if match is None:
+            return SimpleHTTPRequestHandler.do_GET(self)
+        with open(self.translate_path(self.path), "rb") as f:
+            data = f.read()
+        start, end = int(match.group(1)), min(int(match.group(2)), len(data) - 1)
+        self.ranges.append((start, end))
+        self.send_response(206)
+        self.send_header(
+            "Content-Range", "bytes {0}-{1}/{2}".format(start, end, len(data))
+        )
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(data[start : end + 1])
+
+
+def overlaps(ranges, start, end):
+    """True if each range overlaps one of the byte ranges [start, end)"""
+    return all(
+        any((a < e) and (b >= s) for s, e in zip(start, end)) for a, b in ranges
+    )
+
+
+def main():
+    folder = curdir / "spectra_files"
+    server = HTTPServer(
+        ("127.0.0.1", 0), partial(RangeHandler, directory=str(folder))
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = "http://127.0.0.1:{0}/mapping.wdf".format(server.server_port)
+    local = WDFReader(folder / "mapping.wdf")
+    ranges = RangeHandler.ranges
+    try:
+        block_size = 512
+        source = HTTPSource(url, block_size=block_size, cache_blocks=8)
+        reader = WDFReader(source)
+        # Opening reads the file header and the header of each block
+        assert reader.block_table == local.block_table
+        assert reader.title == local.title
+        assert source.n_requests == len(ranges)
+        block_starts = [offset for name, uid, offset, size in local.block_table]
+        block_ends = [offset + 16 for offset in block_starts]
+        assert overlaps(ranges, [0] + block_starts, [0x200] + block_ends)
+
+        # A single spectrum only fetches the blocks holding it, if they
+        # are not cached yet
+        n_open = len(ranges)
+        uid, pos, size = local.block_info["DATA"]
+        pps = local.point_per_spectrum
+        i = local.count // 2
+        start = pos + 16 + 4 * i * pps
+        assert np.array_equal(reader.read_spectra(i), local.read_spectra(i))
+        assert overlaps(ranges[n_open:], [start], [start + 4 * pps])
+
+        # Large reads bypass the block cache and match the local file
+        assert np.array_equal(reader.spectra, local.spectra)
+        assert np.array_equal(reader.xdata, local.xdata)
+        assert np.array_equal(reader.origin_list, local.origin_list)
+        n_data = 4 * local.count * pps
+        if n_data > 4 * block_size:
+            assert (pos + 16, pos + 15 + n_data) in ranges
+        reader.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        local.close()
+
+
+if __name__ == "__main__":
+    main()
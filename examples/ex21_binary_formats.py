@@ -0,0 +1,85 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to export spectra to binary formats, #
+# HDF5, zarr and Parquet are only checked if installed       #
+##############################################################
+
+import json
+import tempfile
+import numpy as np
+from pathlib import Path
+from renishawWiRE import WDFReader
+from renishawWiRE import formats
+from _path import curdir
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        export(Path(tmpdir))
+
+
+def export(outdir):
+    filename = curdir / "spectra_files" / "mapping.wdf"
+    reader = WDFReader(filename)
+    spectra = reader.spectra
+    pps = reader.point_per_spectrum
+    meta = formats.metadata(reader)
+    assert meta["count"] == reader.count
+    assert meta["map_shape"] == list(reader.map_shape)
+
+    output = outdir / "mapping.npz"
+    # Written twice, the output is replaced
+    for i in range(2):
+        formats.write_npz(reader, output)
+    with np.load(output) as npz:
+        assert np.array_equal(npz["spectra"], spectra)
+        assert np.array_equal(npz["xdata"], reader.xdata)
+        assert np.array_equal(npz["origin_list"], reader.origin_list)
+        assert json.loads(str(npz["metadata"])) == meta
+    assert not list(outdir.glob("*.tmp"))
+
+    if h5py is not None:
+        output = outdir / "mapping.h5"
+        formats.write_hdf5(reader, output)
+        with h5py.File(str(output), "r") as h5:
+            assert np.array_equal(h5["spectra"][...], spectra)
+            assert np.array_equal(h5["origin_list"][...], reader.origin_list)
+            assert h5.attrs["count"] == reader.count
+
+    if zarr is not None:
+        output = outdir / "mapping.zarr"
+        for i in range(2):
+            formats.write_zarr(reader, output)
+        group = zarr.open_group(str(output), mode="r")
+        assert np.array_equal(group["spectra"][...], spectra)
+        assert np.array_equal(group["origin_list/Spatial_X"][...], reader.xpos)
+
+    if pyarrow is not None:
+        output = outdir / "mapping.parquet"
+        formats.write_parquet(reader, output)
+        table = pyarrow.parquet.read_table(str(output))
+        assert np.array_equal(table.column("index").to_numpy(), np.arange(reader.count))
+        values = np.stack(table.column("spectrum").to_numpy(zero_copy_only=False))
+        assert np.array_equal(values, np.reshape(spectra, (-1, pps)))
+        assert np.array_equal(table.column("Spatial_Y").to_numpy(), reader.ypos)
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
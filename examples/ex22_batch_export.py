@@ -0,0 +1,60 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to export many files in one call of  #
+# wdf-export, in parallel processes                          #
+##############################################################
+
+import filecmp
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from renishawWiRE.export import export_file
+from _path import curdir
+
+
+def wdf_export(*args):
+    return subprocess.run(
+        ["wdf-export"] + [str(a) for a in args],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        batch_export(Path(tmpdir))
+
+
+def batch_export(root):
+    inputs = root / "input"
+    for sub, name in (("a", "mapping"), ("a", "sp"), ("b", "mapping")):
+        (inputs / sub).mkdir(parents=True, exist_ok=True)
+        shutil.copy(curdir / "spectra_files" / (name + ".wdf"), inputs / sub)
+
+    # Both mapping.wdf would be exported to output/mapping.csv
+    run = wdf_export(inputs, "-d", root / "output")
+    assert run.returncode == 1
+    assert "same output" in run.stderr
+    assert not (root / "output").exists()
+
+    # {rel} keeps the sub-directories of the input
+    run = wdf_export(inputs, "-d", root / "output" / "{rel}", "-j", "2")
+    assert run.returncode == 0, run.stderr
+    assert "3 exported, 0 skipped, 0 failed" in run.stdout
+    for sub, name in (("a", "mapping"), ("a", "sp"), ("b", "mapping")):
+        output = root / "output" / sub / (name + ".csv")
+        single = root / (name + ".csv")
+        assert export_file(inputs / sub / (name + ".wdf"), single, ".csv") == 0
+        assert filecmp.cmp(output, single, shallow=False)
+
+    # Unchanged files are skipped with -u
+    run = wdf_export(inputs, "-d", root / "output" / "{rel}", "-u")
+    assert run.returncode == 0, run.stderr
+    assert "0 exported, 3 skipped, 0 failed" in run.stdout
+
+
+if __name__ == "__main__":
+    main()
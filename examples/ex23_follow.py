@@ -0,0 +1,81 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to follow a measurement that is      #
+# still running. The running measurement is simulated by     #
+# changing the number of spectra in the header of a copy     #
+##############################################################
+
+import shutil
+import struct
+import tempfile
+import numpy as np
+from renishawWiRE import WDFReader
+from renishawWiRE.types import Offsets
+from pathlib import Path
+from _path import curdir
+
+
+def set_count(filename, count):
+    """Write the number of measured spectra into the header"""
+    with open(filename, "r+b") as f:
+        # After point_per_spectrum (int32) and capacity (int64)
+        f.seek(Offsets.measurement_info + 0xC)
+        f.write(struct.pack("<q", count))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        follow(Path(tmpdir) / "running.wdf")
+
+
+def follow(filename):
+    source = curdir / "spectra_files" / "mapping.wdf"
+    reference = WDFReader(source)
+    count = reference.count
+    pps = reference.point_per_spectrum
+    shutil.copy(source, filename)
+
+    for mmap in (False, True):
+        # The measurement has started, no spectrum yet
+        set_count(filename, 0)
+        reader = WDFReader(filename, mmap=mmap)
+        assert reader.count == 0
+        assert len(reader.xpos) == 0
+        assert reader.map_shape == reference.map_shape
+        assert reader.spectra.shape == (0, pps)
+        assert list(reader.iter_spectra()) == []
+        set_count(filename, count // 3)
+        assert reader.refresh() == count // 3
+        assert np.array_equal(reader.xpos, reference.xpos[: count // 3])
+        reader.close()
+
+        set_count(filename, count // 3)
+        reader = WDFReader(filename, mmap=mmap)
+        assert not reader.is_completed
+        assert reader.count == count // 3
+        spectra = np.reshape(reader.spectra, (-1, pps))
+        assert np.array_equal(spectra, reference.read_spectra(slice(0, count // 3)))
+        assert np.array_equal(reader.xpos, reference.xpos[: count // 3])
+
+        # New spectra are read, the old ones are kept
+        set_count(filename, 2 * count // 3)
+        assert reader.refresh() == 2 * count // 3 - count // 3
+        assert reader.refresh() == 0
+        assert reader.count == 2 * count // 3
+        assert np.array_equal(reader.xpos, reference.xpos[: 2 * count // 3])
+
+        # follow() ends when the measurement is completed
+        set_count(filename, count)
+        assert list(reader.follow(interval=0.01, timeout=5)) == [
+            count - 2 * count // 3
+        ]
+        assert reader.is_completed
+        assert np.array_equal(reader.spectra, reference.spectra)
+        assert np.array_equal(reader.origin_list, reference.origin_list)
+        reader.close()
+    reference.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to read files from asyncio without   #
+# blocking the event loop                                    #
+##############################################################
+
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from renishawWiRE import WDFReader, AsyncWDFReader
+from _path import curdir
+
+
+async def read_all(filenames, executor):
+    # At most 2 blocking calls in flight over all files
+    semaphore = asyncio.Semaphore(2)
+    readers = await asyncio.gather(
+        *[
+            AsyncWDFReader.open(f, executor=executor, semaphore=semaphore)
+            for f in filenames
+        ]
+    )
+    results = []
+    for reader in readers:
+        async with reader:
+            # Header attributes are available directly, blocks are loaded
+            try:
+                reader.xdata
+                raise AssertionError("xdata should not be loaded yet")
+            except AttributeError:
+                pass
+            xdata = await reader.load("xdata")
+            first = await reader.read_spectra(0)
+            chunks = [
+                spectra async for indices, spectra, positions in reader.iter_spectra(
+                    chunk_size=5
+                )
+            ]
+            results.append((reader.count, xdata, first, np.concatenate(chunks)))
+    return results
+
+
+def main():
+    filenames = [
+        curdir / "spectra_files" / "{0}.wdf".format(name)
+        for name in ("sp", "line", "mapping")
+    ]
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = asyncio.run(read_all(filenames, executor))
+    for filename, (count, xdata, first, spectra) in zip(filenames, results):
+        reader = WDFReader(filename)
+        pps = reader.point_per_spectrum
+        assert count == reader.count
+        assert np.array_equal(xdata, reader.xdata)
+        assert np.array_equal(first, reader.read_spectra(0))
+        assert np.array_equal(spectra, np.reshape(reader.spectra, (-1, pps)))
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
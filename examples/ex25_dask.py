@@ -0,0 +1,48 @@
+#! /usr/bin/env python3
+
+##############################################################
+# The example shows how to process a mapping out of core     #
+# with dask, and the lazy spectra used without dask          #
+##############################################################
+
+import numpy as np
+from renishawWiRE import WDFReader
+from _path import curdir
+
+try:
+    import dask
+except ImportError:
+    dask = None
+
+
+def main():
+    filename = curdir / "spectra_files" / "mapping.wdf"
+    reader = WDFReader(filename)
+    spectra = reader.spectra
+    w, h = reader.map_shape
+
+    # A second reader, the DATA block is not loaded in memory
+    lazy_reader = WDFReader(filename)
+    # Only the selected spectra are read
+    lazy = lazy_reader.lazy_spectra()
+    assert lazy.shape == spectra.shape
+    assert np.array_equal(lazy[h - 1, 0], spectra[h - 1, 0])
+    assert np.array_equal(lazy[:, 1:3], spectra[:, 1:3])
+
+    if dask is not None:
+        array = lazy_reader.to_dask(chunk_size=2 * w)
+        assert array.shape == spectra.shape
+        # Chunks are whole rows of the map (2 here) with all points
+        assert all(c <= 2 for c in array.chunks[0])
+        assert array.chunks[1] == (w,)
+        assert array.chunks[2] == (reader.point_per_spectrum,)
+        assert np.array_equal(array.compute(), spectra)
+        middle = len(reader.xdata) // 2
+        peak = array[:, :, middle:].max(axis=2).compute()
+        assert np.array_equal(peak, spectra[:, :, middle:].max(axis=2))
+    lazy_reader.close()
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,8 @@
 from .wdfReader import WDFReader
+from .header import read_header, read_headers
+from .batch import load_many
+from .dataset import WDFDataset
+from .aio import AsyncWDFReader
+from .ingest import Ingest
+from .catalog import Catalog
 from .export import main
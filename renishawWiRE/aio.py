@@ -0,0 +1,122 @@
+# asyncio facade of WDFReader
+# All blocking work (block walk, header decoding and reading spectra)
+# runs in an executor, so that the event loop is never blocked
+import asyncio
+import functools
+from .wdfReader import WDFReader
+
+
+def _close_reader(future):
+    """Close a reader whose opening coroutine has been cancelled"""
+    if (not future.cancelled()) and (future.exception() is None):
+        future.result().close()
+
+
+class AsyncWDFReader(object):
+    """Asynchronous access to a `WDFReader`
+
+    Create with `reader = await AsyncWDFReader.open(file_name)`.
+
+    Args (of `open`):
+    file_name : Same as `WDFReader`
+    executor (concurrent.futures.Executor) : Executor for the blocking
+                calls, default is the event loop's default executor.
+                Use a bounded ThreadPoolExecutor to limit the threads
+    semaphore (asyncio.Semaphore) : Limits the number of blocking calls in
+                flight. Share one semaphore between readers to bound the
+                concurrency over many files
+    Other keyword arguments are passed to `WDFReader`
+
+    Header attributes (`title`, `count`, `map_shape` once loaded etc.)
+    are available directly. Attributes that need parsing of a block are
+    loaded with `await reader.load(name)`.
+
+    Cancelling a coroutine returns at the next executor call; a read
+    already running in a thread finishes in the background and its
+    result is discarded.
+    """
+
+    def __init__(self, reader, executor=None, semaphore=None):
+        self.reader = reader
+        self.executor = executor
+        self.semaphore = semaphore
+
+    @classmethod
+    async def open(cls, file_name, executor=None, semaphore=None, **kwargs):
+        """Open a wdf file without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        func = functools.partial(WDFReader, file_name, **kwargs)
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            future = loop.run_in_executor(executor, func)
+            try:
+                # Shielded, so that a cancelled open still closes the file
+                reader = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                future.add_done_callback(_close_reader)
+                raise
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+        return cls(reader, executor=executor, semaphore=semaphore)
+
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking call in the executor"""
+        loop = asyncio.get_running_loop()
+        func = functools.partial(func, *args, **kwargs)
+        if self.semaphore is None:
+            return await loop.run_in_executor(self.executor, func)
+        async with self.semaphore:
+            return await loop.run_in_executor(self.executor, func)
+
+    def __getattr__(self, name):
+        """Attributes of the reader that are already parsed"""
+        reader = self.__dict__.get("reader", None)
+        if (reader is None) or (name.startswith("_")):
+            raise AttributeError(name)
+        if (name in WDFReader._lazy_blocks) and (name not in reader.__dict__):
+            raise AttributeError(
+                "{0} is not loaded yet, use `await load({0!r})`".format(name)
+            )
+        return getattr(reader, name)
+
+    async def load(self, *names):
+        """Parse the blocks of attributes `names` in the executor
+        Returns the value, or a tuple of values for several names
+        """
+        values = await self._run(
+            lambda: tuple(getattr(self.reader, name) for name in names)
+        )
+        return values[0] if len(values) == 1 else values
+
+    async def read_spectra(self, selection):
+        """Same as `WDFReader.read_spectra`, in the executor"""
+        return await self._run(self.reader.read_spectra, selection)
+
+    async def iter_spectra(self, chunk_size=1024, as_grid_rows=False, start=0):
+        """Same as `WDFReader.iter_spectra`, each chunk is read in the executor
+        and can be cancelled between chunks
+        """
+        iterator = self.reader.iter_spectra(
+            chunk_size=chunk_size, as_grid_rows=as_grid_rows, start=start
+        )
+        sentinel = object()
+        while True:
+            chunk = await self._run(next, iterator, sentinel)
+            if chunk is sentinel:
+                return
+            yield chunk
+
+    async def refresh(self):
+        """Same as `WDFReader.refresh`, in the executor"""
+        return await self._run(self.reader.refresh)
+
+    async def close(self):
+        await self._run(self.reader.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -0,0 +1,118 @@
+# Parallel loading of many wdf files into one stacked array
+import os
+import numpy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from .wdfReader import WDFReader
+from .header import read_header
+
+
+class StackedSpectra(object):
+    """Spectra of several wdf files stacked into one array
+
+    Attributes:
+    spectra (numpy.array) : float32 array of shape
+                            (total number of spectra, point_per_spectrum)
+    offsets (numpy.array) : Spectra of the i-th file are
+                            spectra[offsets[i] : offsets[i + 1]]
+    xdata (list) : x-axis data of each file. Files with identical
+                   x-axis share the same numpy.array object
+    metadata (list) : Header of each file as from `read_header`,
+                      with additional key `file_name`
+    positions (numpy.array) : Structured array with fields
+                              file_index, x, y, z for each spectrum
+    """
+
+    def __init__(self, spectra, offsets, xdata, metadata, positions):
+        self.spectra = spectra
+        self.offsets = offsets
+        self.xdata = xdata
+        self.metadata = metadata
+        self.positions = positions
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def file_spectra(self, i):
+        """Spectra of the i-th file, as a view of `spectra`"""
+        return self.spectra[self.offsets[i] : self.offsets[i + 1]]
+
+
+def _load_one(file_name, count, out=None):
+    """Read the first `count` spectra, x-axis and positions of a single file
+    If `out` is given, the spectra are read directly into it
+    """
+    reader = WDFReader(file_name)
+    try:
+        if out is not None:
+            if reader.read_spectra_into(out) != count:
+                raise ValueError(
+                    "{0} has less than {1} spectra!".format(file_name, count)
+                )
+            spectra = None
+        else:
+            spectra = reader.read_spectra(slice(0, count))
+        xdata = reader.xdata
+        pos = [
+            getattr(reader, name)[:count] if "ORGN" in reader.block_info else None
+            for name in ("xpos", "ypos", "zpos")
+        ]
+    finally:
+        reader.close()
+    return spectra, xdata, pos
+
+
+def load_many(file_names, workers=None, executor="thread"):
+    """Load the spectra of many wdf files in parallel
+
+    Args:
+    file_names (iterable) : Paths of the wdf files
+    workers (int) : Number of parallel workers, default os.cpu_count()
+    executor (str) : "thread" or "process". Threads write directly into
+                     the stacked array, processes send the spectra back
+
+    All files must have the same `point_per_spectrum`.
+    Returns a `StackedSpectra` object
+    """
+    if executor not in ("thread", "process"):
+        raise ValueError("executor must be thread or process!")
+    file_names = list(file_names)
+    workers = workers or os.cpu_count() or 1
+    # Headers are small, always read them with threads
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        metadata = list(pool.map(read_header, file_names))
+    for file_name, header in zip(file_names, metadata):
+        header["file_name"] = file_name
+    pps = set(header["point_per_spectrum"] for header in metadata)
+    if len(pps) > 1:
+        raise ValueError("Files have different number of points per spectrum!")
+    pps = pps.pop() if len(pps) > 0 else 0
+    counts = [header["count"] for header in metadata]
+    offsets = numpy.concatenate(([0], numpy.cumsum(counts))).astype("int64")
+    # Preallocate the stacked array
+    spectra = numpy.empty((offsets[-1], pps), dtype="float32")
+
+    if executor == "thread":
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outs = [spectra[offsets[i] : offsets[i + 1]] for i in range(len(counts))]
+            results = list(pool.map(_load_one, file_names, counts, outs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_load_one, file_names, counts))
+        for i, (data, xdata, pos) in enumerate(results):
+            spectra[offsets[i] : offsets[i + 1]] = data
+
+    positions = numpy.zeros(
+        offsets[-1],
+        dtype=[("file_index", "int64"), ("x", "f8"), ("y", "f8"), ("z", "f8")],
+    )
+    xdata_list = []
+    shared = {}
+    for i, (data, xdata, pos) in enumerate(results):
+        # Files with identical x-axis share a single array
+        xdata_list.append(shared.setdefault(xdata.tobytes(), xdata))
+        rows = positions[offsets[i] : offsets[i + 1]]
+        rows["file_index"] = i
+        for name, value in zip(("x", "y", "z"), pos):
+            if value is not None:
+                rows[name] = value
+    return StackedSpectra(spectra, offsets, xdata_list, metadata, positions)
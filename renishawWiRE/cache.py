@@ -0,0 +1,176 @@
+# On-disk cache of parsed wdf blocks
+# Arrays are stored as .npy files and loaded with numpy memory mapping,
+# so that reopening a large file only parses its header
+import hashlib
+import os
+import pickle
+import shutil
+import numpy
+from .types import Offsets
+
+# Version of the layout of the entries, part of the key
+_CACHE_VERSION = 2
+
+
+def default_cache_dir():
+    """Directory from $RENISHAWWIRE_CACHE, or ~/.cache/renishawWiRE"""
+    directory = os.environ.get("RENISHAWWIRE_CACHE", None)
+    if directory is None:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+        directory = os.path.join(base, "renishawWiRE")
+    return directory
+
+
+class _ArrayFile(object):
+    """Placeholder for an array stored in its own .npy file"""
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+
+
+class ParseCache(object):
+    """Cache of parsed blocks of wdf files, used with `WDFReader(cache=...)`
+
+    Args:
+    directory (str or pathlib.Path) : Cache directory, see `default_cache_dir`
+    max_bytes (int) : Size limit of the cache. When exceeded, the least
+                      recently used files are evicted
+
+    Each wdf file has one entry, keyed by its path, size, mtime and the
+    hash of its header. Modified files therefore never hit stale entries.
+    Only completed measurements are cached, and blocks larger than
+    `max_bytes` are not stored. Arrays are memory-mapped
+    when loaded (copy-on-write, or read-only if the reader uses `mmap`).
+    Other values are pickled, only use cache directories you trust.
+    """
+
+    def __init__(self, directory=None, max_bytes=2 * 1024 ** 3):
+        self.directory = str(directory or default_cache_dir())
+        self.max_bytes = max_bytes
+        # Running size of the cache, the directory is only scanned again
+        # when it exceeds max_bytes
+        self._total = None
+
+    def key(self, file_obj, header):
+        """Key of a file from its object and first 0x200 bytes, None if the
+        file has no path on disk
+        """
+        name = getattr(file_obj, "name", None)
+        if not isinstance(name, str):
+            return None
+        try:
+            st = os.fstat(file_obj.fileno())
+        except (AttributeError, OSError, ValueError):
+            return None
+        h = hashlib.sha1()
+        h.update(
+            "{0}\0{1}\0{2}\0{3}\0".format(
+                _CACHE_VERSION, os.path.abspath(name), st.st_size, st.st_mtime_ns
+            ).encode("utf8")
+        )
+        h.update(header[: Offsets.data_block])
+        return h.hexdigest()
+
+    def load(self, key, block_name, mmap_mode="c"):
+        """Cached attributes of a block as dict, None if not cached"""
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, block_name + ".pkl"), "rb") as f:
+                values = pickle.load(f)
+            for attr, value in values.items():
+                if isinstance(value, _ArrayFile):
+                    values[attr] = numpy.load(
+                        os.path.join(entry, value.file_name), mmap_mode=mmap_mode
+                    )
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+        # Mark as recently used
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return values
+
+    def store(self, key, block_name, values):
+        """Store the attributes (dict) of a block, old entries are evicted
+        when the cache grows over `max_bytes`
+        """
+        n_bytes = sum(
+            value.nbytes
+            for value in values.values()
+            if isinstance(value, numpy.ndarray)
+        )
+        if n_bytes > self.max_bytes:
+            # Would evict everything including itself
+            return
+        if self._total is None:
+            self._total = sum(size for mtime, size, entry in self.entries())
+        entry = os.path.join(self.directory, key)
+        try:
+            os.makedirs(entry, exist_ok=True)
+            stored = {}
+            for attr, value in values.items():
+                if isinstance(value, numpy.ndarray) and value.dtype != object:
+                    file_name = "{0}.{1}.npy".format(block_name, attr)
+                    self._total += self.__write(
+                        entry, file_name, lambda f: numpy.save(f, value)
+                    )
+                    stored[attr] = _ArrayFile(file_name)
+                else:
+                    stored[attr] = value
+            # The .pkl file is written last, it marks the block as complete
+            self._total += self.__write(
+                entry,
+                block_name + ".pkl",
+                lambda f: pickle.dump(stored, f, protocol=pickle.HIGHEST_PROTOCOL),
+            )
+        except OSError:
+            # The cache is optional, never fail the reader
+            return
+        if self._total > self.max_bytes:
+            self.evict()
+
+    def __write(self, entry, file_name, write):
+        """Write a file atomically, return its size"""
+        path = os.path.join(entry, file_name)
+        tmp = "{0}.{1}.tmp".format(path, os.getpid())
+        with open(tmp, "wb") as f:
+            write(f)
+            size = f.tell()
+        os.replace(tmp, path)
+        return size
+
+    def entries(self):
+        """List of (mtime, size, path) of the cache entries"""
+        result = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return result
+        for name in names:
+            entry = os.path.join(self.directory, name)
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry)
+                )
+                result.append((os.path.getmtime(entry), size, entry))
+            except OSError:
+                continue
+        return result
+
+    def evict(self):
+        """Remove least recently used entries until below `max_bytes`"""
+        entries = sorted(self.entries())
+        total = sum(size for mtime, size, entry in entries)
+        for mtime, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+        self._total = total
+
+    def clear(self):
+        """Remove all entries"""
+        for mtime, size, entry in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
+        self._total = 0
@@ -0,0 +1,299 @@
+# SQLite catalog of the metadata of many wdf files
+# Headers, mapping information and block tables are stored once and
+# updated incrementally, queries return entries that open readers
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path
+from .utils import json_value
+from .wdfReader import WDFReader
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    title TEXT,
+    username TEXT,
+    application_name TEXT,
+    application_version TEXT,
+    measurement_type TEXT,
+    scan_type TEXT,
+    spectral_unit TEXT,
+    laser_length REAL,
+    count INTEGER,
+    capacity INTEGER,
+    point_per_spectrum INTEGER,
+    is_completed INTEGER,
+    map_w INTEGER,
+    map_h INTEGER,
+    map_info TEXT
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_file ON blocks(file_id);
+CREATE INDEX IF NOT EXISTS files_query
+    ON files(measurement_type, scan_type, laser_length, count);
+"""
+
+_HEADER_FIELDS = (
+    "title",
+    "username",
+    "application_name",
+    "measurement_type",
+    "scan_type",
+    "spectral_unit",
+    "laser_length",
+    "count",
+    "capacity",
+    "point_per_spectrum",
+    "is_completed",
+)
+
+
+def _read_metadata(path):
+    """Parse header, WMAP and block table of a single file"""
+    st = os.stat(path)
+    reader = WDFReader(path)
+    try:
+        row = dict(path=path, size=st.st_size, mtime_ns=st.st_mtime_ns)
+        for name in _HEADER_FIELDS:
+            row[name] = json_value(getattr(reader, name))
+        row["application_version"] = ".".join(
+            str(v) for v in reader.application_version
+        )
+        row["map_w"] = row["map_h"] = row["map_info"] = None
+        if "WMAP" in reader.block_info:
+            # Only reads the WMAP block and the ORGN column headers
+            row["map_w"], row["map_h"] = reader.map_shape
+            row["map_info"] = json.dumps(
+                {k: json_value(v) for k, v in reader.map_info.items()}
+            )
+        blocks = list(reader.block_table)
+    finally:
+        reader.close()
+    return row, blocks
+
+
+class CatalogEntry(object):
+    """A file in the catalog
+
+    Attributes are the columns of the catalog, e.g. `path`, `title`,
+    `count`, `scan_type` (name), `map_shape` (w, h) and `map_info` (dict)
+    """
+
+    def __init__(self, row):
+        self.__dict__.update(row)
+        map_w, map_h = self.__dict__.pop("map_w"), self.__dict__.pop("map_h")
+        self.map_shape = (map_w, map_h) if map_w is not None else None
+        if self.map_info is not None:
+            self.map_info = json.loads(self.map_info)
+        self.is_completed = bool(self.is_completed)
+
+    def open(self, **kwargs):
+        """Open the file with `WDFReader`, kwargs are passed to the reader"""
+        return WDFReader(self.path, **kwargs)
+
+    def __repr__(self):
+        return "CatalogEntry({0!r})".format(self.path)
+
+
+class Catalog(object):
+    """Metadata catalog of wdf files in a SQLite database
+
+    Args:
+    db_path (str or pathlib.Path) : Database file, created if needed.
+                                    ":memory:" for a temporary catalog
+
+    Files are keyed by their absolute path, and only parsed again when
+    size or mtime change. Example:
+
+        catalog = Catalog("archive.sqlite")
+        catalog.update("/data/raman", workers=8)
+        for entry in catalog.query(scan_type="StreamLineHR",
+                                   laser_length=532, min_count=10000,
+                                   username="X"):
+            reader = entry.open()
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.execute("PRAGMA foreign_keys = ON")
+            self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def _find_files(self, paths, pattern):
+        """Absolute paths of wdf files, directories are searched recursively"""
+        if isinstance(paths, (str, os.PathLike)):
+            paths = [paths]
+        for path in paths:
+            path = Path(path).expanduser().resolve()
+            if path.is_dir():
+                for dirpath, dirnames, filenames in os.walk(path):
+                    dirnames.sort()
+                    for filename in sorted(filenames):
+                        if fnmatch(filename, pattern):
+                            yield os.path.join(dirpath, filename)
+            else:
+                yield str(path)
+
+    def update(self, paths, pattern="*.wdf", workers=None):
+        """Add new and changed files to the catalog
+
+        Args:
+        paths : A file or directory, or a list of them
+        pattern (str) : File name pattern in directories
+        workers (int) : Number of threads parsing the files
+
+        Returns (n_updated, errors) where errors is a dict path -> exception
+        """
+        with self._lock:
+            known = {
+                row["path"]: (row["size"], row["mtime_ns"])
+                for row in self._db.execute("SELECT path, size, mtime_ns FROM files")
+            }
+        changed = []
+        for path in self._find_files(paths, pattern):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if known.get(path, None) != (st.st_size, st.st_mtime_ns):
+                changed.append(path)
+
+        errors = {}
+        n_updated = 0
+
+        def _parse(path):
+            try:
+                return _read_metadata(path)
+            except Exception as e:
+                errors[path] = e
+                return None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_parse, changed)
+            while True:
+                # One transaction per batch of files
+                batch = [r for _, r in zip(range(256), results)]
+                if not batch:
+                    break
+                batch = [r for r in batch if r is not None]
+                with self._lock, self._db:
+                    for row, blocks in batch:
+                        self.__store(row, blocks)
+                n_updated += len(batch)
+        return n_updated, errors
+
+    def __store(self, row, blocks):
+        """Insert or replace a file and its blocks, in a transaction"""
+        columns = list(row.keys())
+        self._db.execute("DELETE FROM files WHERE path = ?", (row["path"],))
+        cursor = self._db.execute(
+            "INSERT INTO files ({0}) VALUES ({1})".format(
+                ", ".join(columns), ", ".join("?" * len(columns))
+            ),
+            [row[c] for c in columns],
+        )
+        file_id = cursor.lastrowid
+        self._db.executemany(
+            "INSERT INTO blocks (file_id, name, uid, offset, size) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [(file_id,) + tuple(block) for block in blocks],
+        )
+
+    def prune(self):
+        """Remove files that no longer exist, returns their number"""
+        with self._lock:
+            paths = [row[0] for row in self._db.execute("SELECT path FROM files")]
+        missing = [(path,) for path in paths if not os.path.isfile(path)]
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM files WHERE path = ?", missing)
+        return len(missing)
+
+    def query(
+        self,
+        where=None,
+        params=(),
+        min_count=None,
+        max_count=None,
+        laser_length=None,
+        laser_tolerance=1.0,
+        **equal
+    ):
+        """Find files in the catalog
+
+        Args:
+        where (str) : Additional SQL condition on the `files` table
+        params (tuple) : Parameters of `where`
+        min_count, max_count (int) : Range of the number of spectra
+        laser_length (float) : Laser wavelength in nm, matched within
+                               `laser_tolerance`
+        Other keyword arguments are columns that must be equal, e.g.
+        username="X", scan_type="StreamLineHR" or
+        measurement_type=MeasurementType.Mapping
+
+        Returns a list of `CatalogEntry`, ordered by path
+        """
+        conditions = []
+        values = []
+        for column, value in equal.items():
+            if column not in _HEADER_FIELDS + ("path", "application_version"):
+                raise ValueError("Unknown catalog column {0}!".format(column))
+            conditions.append("{0} = ?".format(column))
+            values.append(json_value(value))
+        if min_count is not None:
+            conditions.append("count >= ?")
+            values.append(min_count)
+        if max_count is not None:
+            conditions.append("count <= ?")
+            values.append(max_count)
+        if laser_length is not None:
+            conditions.append("ABS(laser_length - ?) <= ?")
+            values.extend([laser_length, laser_tolerance])
+        if where is not None:
+            conditions.append("({0})".format(where))
+            values.extend(params)
+        sql = "SELECT * FROM files"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY path"
+        with self._lock:
+            rows = self._db.execute(sql, values).fetchall()
+        return [CatalogEntry(dict(row)) for row in rows]
+
+    def blocks(self, path):
+        """Block table of a file as list of (name, uid, offset, size)"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT b.name, b.uid, b.offset, b.size FROM blocks AS b "
+                "JOIN files ON files.id = b.file_id "
+                "WHERE files.path = ? ORDER BY b.offset",
+                (str(Path(path).expanduser().resolve()),),
+            ).fetchall()
+        return [tuple(row) for row in rows]
@@ -0,0 +1,150 @@
+# Virtual dataset over many wdf files
+# The spectra of all files form one logical array, indexing reads only
+# the selected spectra from the files that contain them
+import numpy
+from .wdfReader import WDFReader
+from .types import DataType
+
+
+class WDFDataset(object):
+    """Virtual (n_spectra_total, point_per_spectrum) array over many files
+
+    Args:
+    readers (list) : `WDFReader` objects, or anything accepted by
+                     `WDFReader` (paths, buffers), in the order of stacking
+    check_xdata (bool) : Check that all files have the same `xdata`
+
+    Attributes:
+    readers (list) : The underlying readers
+    offsets (numpy.array) : Spectra of the i-th file have the global
+                            indices offsets[i] to offsets[i + 1] - 1
+    shape (int, int) : (n_spectra_total, point_per_spectrum)
+    xdata (numpy.array) : Common x-axis data
+    xpos, ypos, zpos, time (numpy.array) : ORGN columns of all files
+                            concatenated, zeros for files without them.
+                            `time` is in seconds from the earliest
+                            `start_time` of the files
+    start_times (numpy.array) : `start_time` of each file, nan for
+                                files without time column
+    file_index (numpy.array) : Index of the file of each spectrum
+
+    Indexing with an int, slice, list of int or a tuple (spectra, points)
+    reads only the selected spectra, e.g. `dataset[1000:1010, 100:200]`
+    """
+
+    dtype = numpy.dtype("float32")
+    ndim = 2
+
+    def __init__(self, readers, check_xdata=True):
+        self.readers = [
+            r if isinstance(r, WDFReader) else WDFReader(r) for r in readers
+        ]
+        if len(self.readers) == 0:
+            raise ValueError("Dataset needs at least one wdf file!")
+        pps = set(r.point_per_spectrum for r in self.readers)
+        if len(pps) > 1:
+            raise ValueError("Files have different number of points per spectrum!")
+        if check_xdata:
+            xdata = self.readers[0].xdata
+            for r in self.readers[1:]:
+                if not numpy.array_equal(r.xdata, xdata):
+                    raise ValueError("Files have different xdata!")
+        counts = [r.count for r in self.readers]
+        self.offsets = numpy.concatenate(([0], numpy.cumsum(counts))).astype("int64")
+        self.shape = (int(self.offsets[-1]), pps.pop())
+        self._columns = {}
+
+    def __len__(self):
+        return self.shape[0]
+
+    def close(self):
+        for r in self.readers:
+            r.close()
+
+    @property
+    def xdata(self):
+        return self.readers[0].xdata
+
+    @property
+    def file_index(self):
+        return numpy.repeat(numpy.arange(len(self.readers)), numpy.diff(self.offsets))
+
+    @property
+    def start_times(self):
+        return numpy.array(
+            [
+                r.start_time
+                if ("ORGN" in r.block_info) and (r.start_time is not None)
+                else numpy.nan
+                for r in self.readers
+            ]
+        )
+
+    def __column(self, data_type):
+        """Concatenated ORGN column of all files, loaded on first access"""
+        if data_type not in self._columns:
+            column = numpy.zeros(self.shape[0])
+            if data_type == DataType.Time:
+                # Times of each file start at 0, shift by the file start
+                start_times = self.start_times
+                known = start_times[numpy.isfinite(start_times)]
+                shifts = start_times - (known.min() if len(known) > 0 else 0)
+            for i, r in enumerate(self.readers):
+                if "ORGN" not in r.block_info:
+                    continue
+                for header in r.origin_list_header:
+                    if header[1] == data_type:
+                        column[self.offsets[i] : self.offsets[i + 1]] = header[4]
+                        if data_type == DataType.Time:
+                            column[self.offsets[i] : self.offsets[i + 1]] += shifts[i]
+                        break
+            self._columns[data_type] = column
+        return self._columns[data_type]
+
+    @property
+    def xpos(self):
+        return self.__column(DataType.Spatial_X)
+
+    @property
+    def ypos(self):
+        return self.__column(DataType.Spatial_Y)
+
+    @property
+    def zpos(self):
+        return self.__column(DataType.Spatial_Z)
+
+    @property
+    def time(self):
+        return self.__column(DataType.Time)
+
+    def __read(self, indices):
+        """Read spectra at global indices, routed to the files"""
+        indices = numpy.asarray(indices, dtype="int64")
+        flat = indices.ravel()
+        flat = numpy.where(flat < 0, flat + self.shape[0], flat)
+        if numpy.any((flat < 0) | (flat >= self.shape[0])):
+            raise IndexError("Spectrum index out of range of {0}!".format(len(self)))
+        data = numpy.empty((len(flat), self.shape[1]), dtype=self.dtype)
+        file_of = numpy.searchsorted(self.offsets, flat, side="right") - 1
+        for i in numpy.unique(file_of):
+            mask = file_of == i
+            local = flat[mask] - self.offsets[i]
+            data[mask] = self.readers[i].read_spectra(local)
+        return numpy.reshape(data, indices.shape + (self.shape[1],))
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            if len(key) > 2:
+                raise IndexError("Too many indices for the dataset!")
+            key, points = key[0], key[1] if len(key) > 1 else slice(None)
+        else:
+            points = slice(None)
+        if isinstance(key, slice):
+            indices = numpy.arange(*key.indices(self.shape[0]))
+        else:
+            indices = numpy.asarray(key)
+        return self.__read(indices)[..., points]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
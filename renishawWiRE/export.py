@@ -2,16 +2,30 @@
 """Export the renishaw file as plain text files
    usage:
    renishaw-export
+   wdf-export <files, globs or directories> -d <output dir> -j N
 """
 
 from renishawWiRE.wdfReader import WDFReader
 from renishawWiRE.types import MeasurementType
+from renishawWiRE.formats import FORMATS
 from argparse import ArgumentParser, RawTextHelpFormatter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fnmatch import fnmatch
 from pathlib import Path
+import glob
 import os
+import re
 import sys
+import time
 import numpy as np
 
+# Single numeric printf conversion, e.g. %.4f or %2.4e
+_simple_fmt = re.compile(r"^%[-+ #0]*[0-9]*(\.[0-9]+)?[eEfFgGdi]$")
+# Fixed-point format that is formatted with numpy, e.g. %.4f or %10.3f
+_fixed_fmt = re.compile(r"^%([1-9][0-9]*)?\.([0-9]|1[0-2])f$")
+# Min number of wavenumbers per block of `write_spectra`
+_MIN_BLOCK_ROWS = 16
+
 
 def test_version():
     ver = sys.version_info
@@ -28,25 +42,36 @@ def try_attr(obj, attr, type="str"):
         return None
 
 
-def get_pos(reader):
+def _position_columns(reader):
+    """Columns x, y (and z if not all zero) of the spectra positions"""
+    columns = [reader.xpos, reader.ypos]
     if hasattr(reader, "zpos"):
         if np.any(reader.zpos != 0):
-            pos = [
-                "({0:.2f}; {1:.2f}; {2:.2f})".format(x_, y_, z_)
-                for x_, y_, z_ in zip(reader.xpos, reader.ypos, reader.zpos)
-            ]
-        else:
-            pos = [
-                "({0:.2f}; {1:.2f})".format(x_, y_)
-                for x_, y_ in zip(reader.xpos, reader.ypos)
-            ]
-    else:
-        pos = [
-            "({0:.2f}; {1:.2f})".format(x_, y_)
-            for x_, y_ in zip(reader.xpos, reader.ypos)
-        ]
+            columns.append(reader.zpos)
+    return np.column_stack(columns)
 
-    return pos
+
+def _join_fixed(values, decimals, prefix, sep, suffix, delimiter, chunk_size=1 << 16):
+    """Format the rows of 2D `values` with "%.<decimals>f" as
+    prefix + sep.join(row) + suffix, and join the rows with `delimiter`.
+    Formatted with numpy in chunks, see `_format_fixed`
+    """
+    pieces = []
+    n_chunk = max(1, chunk_size // max(1, values.shape[1]))
+    for start in range(0, len(values), n_chunk):
+        # Tab and newline are replaced after formatting
+        text = _format_fixed(values[start : start + n_chunk], decimals, "\t")
+        pieces.append(
+            prefix
+            + text[:-1].replace("\t", sep).replace("\n", suffix + delimiter + prefix)
+            + suffix
+        )
+    return delimiter.join(pieces)
+
+
+def get_pos(reader):
+    """List of the positions "(x; y)" or "(x; y; z)" of all spectra"""
+    return _join_fixed(_position_columns(reader), 2, "(", "; ", ")", "\n").split("\n")
 
 
 def get_unit(reader):
@@ -57,6 +82,184 @@ def get_unit(reader):
     return None
 
 
+def find_wdf_files(inputs, pattern="*.wdf"):
+    """Expand files, glob patterns and directories (searched recursively)
+    into a list of (path, rel), where rel is the directory of the file
+    relative to the directory given as input ("" otherwise)
+    """
+    found = []
+    seen = set()
+    for item in inputs:
+        path = Path(item).expanduser()
+        if path.is_dir():
+            root = path.resolve()
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if fnmatch(filename, pattern):
+                        rel = Path(dirpath).relative_to(root).as_posix()
+                        if rel == ".":
+                            rel = ""
+                        found.append((Path(dirpath) / filename, rel))
+        elif path.exists() or not glob.has_magic(str(path)):
+            found.append((path.resolve(), ""))
+        else:
+            for match in sorted(glob.glob(str(path), recursive=True)):
+                if Path(match).is_file():
+                    found.append((Path(match).resolve(), ""))
+    result = []
+    for path, rel in found:
+        if path not in seen:
+            seen.add(path)
+            result.append((path, rel))
+    return result
+
+
+def output_path(wdf_file, form, output=None, output_dir=None, rel=""):
+    """Name of the exported file
+    `output_dir` is a template formatted with {parent} (directory of
+    the wdf file), {rel} (see `find_wdf_files`) and {stem} (file name
+    without suffix)
+    """
+    if output is not None:
+        return Path(output).expanduser().with_suffix(form)
+    if output_dir is not None:
+        directory = output_dir.format(
+            parent=wdf_file.parent.as_posix(), rel=rel, stem=wdf_file.stem
+        )
+        return Path(directory).expanduser() / (wdf_file.stem + form)
+    return wdf_file.with_suffix(form)
+
+
+def is_up_to_date(wdf_file, output_filename):
+    """True if the output exists and is newer than the wdf file"""
+    try:
+        return output_filename.stat().st_mtime >= wdf_file.stat().st_mtime
+    except OSError:
+        return False
+
+
+def export_file(
+    wdf_file,
+    output_filename,
+    form=".csv",
+    precision="%.4f",
+    verbose=True,
+    positions="header",
+):
+    """Export the spectra (and the mapping image if any) of one wdf file
+    `positions` is "header" or "sidecar" (text formats only, positions
+    and indices written to <output>.positions<form>, see `write_positions`)
+    Returns 0 on success, 1 on errors
+    """
+    if not wdf_file.is_file():
+        print(
+            "The file {0} does not exist. Abort!".format(wdf_file.as_posix()),
+            file=sys.stderr,
+        )
+        return 1
+
+    # Spectra are read from the file while writing, never loaded at once
+    reader = WDFReader(wdf_file, mmap=True)
+    try:
+        return _export_reader(
+            reader, output_filename, form, precision, verbose, positions
+        )
+    finally:
+        reader.close()
+
+
+def _export_reader(reader, output_filename, form, precision, verbose, positions):
+    if verbose:
+        # Output test information
+        print("Your Renishaw file looks like:")
+        reader.print_info()
+
+    # output_filename = root / name
+    if not output_filename.parent.is_dir():
+        os.makedirs(output_filename.parent, exist_ok=True)
+
+    if verbose:
+        print("Extracting spectra data......")
+    try:
+        if form in FORMATS:
+            FORMATS[form](reader, output_filename)
+        else:
+            # Try to guess the
+            if form == ".csv":
+                delimiter = ","
+            else:
+                delimiter = " "
+            header = None
+            if positions == "sidecar":
+                sidecar = output_filename.with_suffix(".positions" + form)
+                header = spectra_header(
+                    reader, delimiter=delimiter, sidecar=sidecar.name
+                )
+                if header is None:
+                    return 1
+                write_positions(sidecar, reader, delimiter=delimiter)
+            status = write_spectra(
+                output_filename,
+                reader,
+                fmt=precision,
+                delimiter=delimiter,
+                header=header,
+            )
+            if status != 0:
+                return 1
+    except ImportError as e:
+        print("{0} Abort!".format(e), file=sys.stderr)
+        return 1
+    except (OSError, FileExistsError):
+        print(
+            "Output file {0} cannot be written. Abort!".format(
+                output_filename.as_posix()
+            ),
+            file=sys.stderr,
+        )
+        return 1
+
+    # There is an image associated?
+    if hasattr(reader, "img"):
+        if verbose:
+            print("Extracting mapping image......")
+        try:
+            extract_img(
+                reader, output_filename=output_filename.with_suffix(".mapping.svg")
+            )
+        except (OSError, FileExistsError):
+            print(
+                "Image file {0} cannot be written. Abort!".format(
+                    output_filename.with_suffix(".mapping.svg").as_posix()
+                ),
+                file=sys.stderr,
+            )
+            return 1
+
+    return 0
+
+
+def _export_job(wdf_file, output_filename, form, precision, positions):
+    """Export one file of a batch, in a worker process
+    Returns (status, seconds)
+    """
+    start = time.perf_counter()
+    try:
+        status = export_file(
+            wdf_file,
+            output_filename,
+            form=form,
+            precision=precision,
+            verbose=False,
+            positions=positions,
+        )
+    except Exception as e:
+        print("{0}: {1}".format(wdf_file.as_posix(), e), file=sys.stderr)
+        status = 1
+    return status, time.perf_counter() - start
+
+
 def main():
     """Main program"""
 
@@ -74,7 +277,15 @@ def main():
         ),
         formatter_class=RawTextHelpFormatter,
     )
-    parser.add_argument("wdf_file", help="Renishaw wdf for input")
+    parser.add_argument(
+        "wdf_file",
+        nargs="+",
+        help=(
+            "Renishaw wdf for input. Several files, glob patterns\n"
+            "or directories (searched for *.wdf recursively) are\n"
+            "exported in a batch"
+        ),
+    )
     parser.add_argument(
         "-o",
         "--output",
@@ -82,7 +293,19 @@ def main():
         help=(
             "name of the exported plain text file.\n"
             "If not specified, use the base name of the "
-            ".wdf file"
+            ".wdf file. Only for a single input file"
+        ),
+    )
+    parser.add_argument(
+        "-d",
+        "--output-dir",
+        default=None,
+        help=(
+            "directory of the exported files, can use the fields\n"
+            "\t{parent} (directory of the .wdf file)\n"
+            "\t{rel} (sub-directory within an input directory)\n"
+            "\t{stem} (name of the .wdf file without suffix)\n"
+            "e.g. -d out/{rel}. Default is the directory of the .wdf file"
         ),
     )
     parser.add_argument(
@@ -93,6 +316,12 @@ def main():
             "format of exported, valid values\n"
             "\t.csv (comma-separated) \n"
             "\t.txt (space-separated) \n"
+            "\t.npz (numpy arrays) \n"
+            "\t.h5 / .hdf5 (HDF5, needs h5py) \n"
+            "\t.zarr (zarr directory, needs zarr) \n"
+            "\t.parquet (one row per spectrum, needs pyarrow) \n"
+            "Binary formats keep the float32 spectra and "
+            "store the metadata as attributes.\n"
             "If not specified, guess from the "
             "output file name.\n"
             "Note: -f option is ignored when "
@@ -108,22 +337,43 @@ def main():
             " Use printf-compatible format such as %%2.4f."
         ),
     )
+    parser.add_argument(
+        "--positions",
+        choices=("header", "sidecar"),
+        default="header",
+        help=(
+            "where positions and indices of the spectra are written\n"
+            "\theader (one line each in the header)\n"
+            "\tsidecar (one line per spectrum in <output>.positions.csv\n"
+            "\tor .txt, recommended for large maps)"
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of files exported in parallel processes",
+    )
+    parser.add_argument(
+        "-u",
+        "--update",
+        action="store_true",
+        help="skip files whose output is newer than the .wdf file",
+    )
 
     args = parser.parse_args()
-    wdf_file = Path(args.wdf_file).expanduser().resolve()
-    if not wdf_file.is_file():
+    files = find_wdf_files(args.wdf_file)
+    if len(files) == 0:
+        print("No .wdf file found. Abort!", file=sys.stderr)
+        return 1
+    if (args.output is not None) and (len(files) > 1):
         print(
-            "The file {0} does not exist. Abort!".format(wdf_file.as_posix()),
+            "-o can only be used with a single input file, use -d. Abort!",
             file=sys.stderr,
         )
         return 1
 
-    reader = WDFReader(wdf_file)
-    # Output test information
-    print("Your Renishaw file looks like:")
-    reader.print_info()
-    # handle the spectra data
-
     form = args.format
     # Try to guess the format from output output_filename
     if args.output is not None:
@@ -132,64 +382,339 @@ def main():
             form = f_
             print("Using format {0} from output file name".format(form))
 
-    if form not in (".csv", ".txt"):
-        print("Only .csv and .txt formats are allowed! Abort.", file=sys.stderr)
+    if not form.startswith("."):
+        form = "." + form
+    if form not in (".csv", ".txt") + tuple(FORMATS):
+        print(
+            "Only {0} formats are allowed! Abort.".format(
+                ", ".join((".csv", ".txt") + tuple(FORMATS))
+            ),
+            file=sys.stderr,
+        )
+        return 1
+
+    jobs = []
+    for wdf_file, rel in files:
+        output_filename = output_path(
+            wdf_file, form, output=args.output, output_dir=args.output_dir, rel=rel
+        )
+        jobs.append((wdf_file, output_filename))
+
+    # Files with the same name in one output directory would overwrite
+    # each other, checked before any export starts
+    inputs = {}
+    for wdf_file, output_filename in jobs:
+        inputs.setdefault(output_filename.resolve(), []).append(wdf_file)
+    duplicates = {k: v for k, v in inputs.items() if len(v) > 1}
+    if duplicates:
+        for output_filename, wdf_files in duplicates.items():
+            print(
+                "{0} would be written by {1}".format(
+                    output_filename.as_posix(),
+                    ", ".join(f.as_posix() for f in wdf_files),
+                ),
+                file=sys.stderr,
+            )
+        print(
+            "Several files have the same output, use {rel} or {parent} in -d. Abort!",
+            file=sys.stderr,
+        )
         return 1
 
-    # Try to guess the
-    if form == ".csv":
-        delimiter = ","
-    else:
-        delimiter = " "
-    X, header = handle_spectra(reader, delimiter=delimiter)
+    if (len(jobs) == 1) and (args.jobs <= 1) and (not args.update):
+        # Single file, as in previous versions
+        wdf_file, output_filename = jobs[0]
+        return export_file(
+            wdf_file, output_filename, form, args.precision, positions=args.positions
+        )
 
-    # root = wdf_file.parent
-    # print(root, name)
-    if args.output is not None:
-        output_filename = Path(args.output).with_suffix(form)
-    else:
-        output_filename = wdf_file.with_suffix(form)
+    return _run_batch(
+        jobs, form, args.precision, args.jobs, args.update, args.positions
+    )
 
-    # output_filename = root / name
-    if not output_filename.parent.is_dir():
-        os.makedirs(output_filename.parent, exist_ok=True)
 
-    print("Extracting spectra data......")
-    try:
-        np.savetxt(
-            output_filename, X, fmt=args.precision, delimiter=delimiter, header=header
+def _run_batch(jobs, form, precision, n_jobs, update, positions="header"):
+    """Export the (wdf_file, output_filename) in `jobs`, and print the
+    summary of all files. Returns 0 if all were exported or skipped
+    """
+    results = {}
+    pending = []
+    for wdf_file, output_filename in jobs:
+        if update and is_up_to_date(wdf_file, output_filename):
+            results[wdf_file] = ("skipped", 0.0)
+        else:
+            pending.append((wdf_file, output_filename))
+
+    def _done(wdf_file, status, seconds):
+        results[wdf_file] = ("ok" if status == 0 else "FAILED", seconds)
+        print(
+            "[{0}/{1}] {2} {3}".format(
+                len(results), len(jobs), results[wdf_file][0], wdf_file.as_posix()
+            )
         )
-    except (OSError, FileExistsError):
+
+    start = time.perf_counter()
+    if (n_jobs <= 1) or (len(pending) <= 1):
+        for wdf_file, output_filename in pending:
+            _done(
+                wdf_file,
+                *_export_job(wdf_file, output_filename, form, precision, positions)
+            )
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = {
+                pool.submit(
+                    _export_job, wdf_file, output_filename, form, precision, positions
+                ): wdf_file
+                for wdf_file, output_filename in pending
+            }
+            for future in as_completed(futures):
+                _done(futures[future], *future.result())
+    elapsed = time.perf_counter() - start
+
+    print("\nSummary:")
+    total_bytes = 0
+    n_failed = 0
+    for wdf_file, output_filename in jobs:
+        status, seconds = results[wdf_file]
+        size = wdf_file.stat().st_size if wdf_file.is_file() else 0
+        if status == "ok":
+            total_bytes += size
+            speed = "{0:8.1f} MB/s".format(size / max(seconds, 1e-9) / 1e6)
+        else:
+            speed = " " * 13
+            n_failed += status == "FAILED"
         print(
-            "Output file {0} cannot be written. Abort!".format(
-                output_filename.as_posix()
-            ),
-            file=sys.stderr,
+            "{0:>7} {1:8.1f} MB {2:7.2f} s {3} {4}".format(
+                status, size / 1e6, seconds, speed, output_filename.as_posix()
+            )
         )
-        return 1
+    n_skipped = sum(1 for status, seconds in results.values() if status == "skipped")
+    print(
+        "{0} exported, {1} skipped, {2} failed, "
+        "{3:.1f} MB in {4:.1f} s ({5:.1f} MB/s)".format(
+            len(jobs) - n_skipped - n_failed,
+            n_skipped,
+            n_failed,
+            total_bytes / 1e6,
+            elapsed,
+            total_bytes / max(elapsed, 1e-9) / 1e6,
+        )
+    )
+    return 1 if n_failed > 0 else 0
 
-    # There is an image associated?
-    if hasattr(reader, "img"):
-        print("Extracting mapping image......")
-        try:
-            extract_img(
-                reader, output_filename=output_filename.with_suffix(".mapping.svg")
+
+# ASCII digits of 0000 to 9999, each packed into one uint32
+_DIGITS4 = np.array(
+    [list("{0:04d}".format(i).encode("ascii")) for i in range(10000)], dtype=np.uint8
+).view(np.uint32)[:, 0]
+
+
+def _put_digits(buf, end, values, n_digits):
+    """Write `n_digits` digits of integer `values` into the columns
+    before `end` of `buf`, 4 digits at a time. Returns the first column
+    """
+    n_values, width = buf.shape
+    while n_digits > 0:
+        n = min(4, n_digits)
+        values, group = np.divmod(values, 10**n)
+        # Unaligned uint32 view on 4 columns of every row, the leading
+        # zeros of a shorter group are overwritten by the next group
+        target = np.ndarray(
+            (n_values,),
+            dtype=_DIGITS4.dtype,
+            buffer=buf,
+            offset=end - 4,
+            strides=(width,),
+        )
+        target[:] = _DIGITS4[group]
+        end -= n
+        n_digits -= n
+    return end
+
+
+def _format_fixed(chunk, decimals, delimiter, field_width=0):
+    """Vectorized "%<field_width>.<decimals>f" formatting of the rows of
+    a 2D array. Same output as the % operator, values close to a rounding
+    tie, nan, inf and very large values are formatted by Python
+    """
+    x = np.asarray(chunk, dtype=np.float64)
+    n_rows, n_cols = x.shape
+    x = x.ravel()
+    neg = np.signbit(x)
+    with np.errstate(invalid="ignore", over="ignore"):
+        scaled = np.abs(x) * 10.0**decimals
+        frac = scaled - np.floor(scaled)
+        # The product has a relative error <= 2^-53, only values this
+        # close to a tie may round differently than Python
+        slow = ~(scaled < 2.0**52) | (np.abs(frac - 0.5) <= scaled * 2.0**-50)
+    q = np.where(slow, 0, np.rint(np.where(slow, 0, scaled))).astype(np.int64)
+    ip, fp = np.divmod(q, 10**decimals)
+    n_int = np.ones(len(x), dtype=np.int64)
+    power = 10
+    while power <= ip.max(initial=0):
+        n_int += ip >= power
+        power *= 10
+    n_frac = decimals + 1 if decimals > 0 else 0
+    lengths = neg + n_int + n_frac
+    slow_text = ["%.{0}f".format(decimals) % v for v in x[slow].tolist()]
+    if slow_text:
+        lengths[slow] = [len(t) for t in slow_text]
+    padded = np.maximum(lengths, field_width)
+    # Each value right-aligned in a row of `width` bytes, followed by
+    # the delimiter or newline. 3 more bytes for writing 4 digits at a time
+    width = int(padded.max(initial=1)) + 4
+    buf = np.zeros((len(x), width), dtype=np.uint8)
+    sep = np.full((n_rows, n_cols), ord(delimiter), dtype=np.uint8)
+    sep[:, -1] = ord("\n")
+    buf[:, -1] = sep.ravel()
+    col = width - 1
+    if decimals > 0:
+        col = _put_digits(buf, col, fp, decimals)
+        buf[:, col - 1] = ord(".")
+        col -= 1
+    rows = np.arange(len(x))
+    _put_digits(buf, col, ip, int(n_int.max(initial=1)))
+    buf[rows[neg], (col - 1 - n_int)[neg]] = ord("-")
+    if slow_text:
+        for i, t in zip(np.nonzero(slow)[0], slow_text):
+            buf[i, width - 1 - len(t) : width - 1] = np.frombuffer(
+                t.encode("ascii"), dtype=np.uint8
             )
-        except (OSError, FileExistsError):
-            print(
-                "Image file {0} cannot be written. Abort!".format(
-                    output_filename.with_suffix(".mapping.svg").as_posix()
-                ),
-                file=sys.stderr,
+    if field_width > 0:
+        # Leading zeros of the integer digits become the padding, only
+        # the columns that can hold padding are checked
+        lo, hi = width - 1 - int(padded.max()), width - 1 - int(lengths.min())
+        if lo < hi:
+            columns = np.arange(lo, hi)
+            pad = (columns >= (width - 1 - padded)[:, None]) & (
+                columns < (width - 1 - lengths)[:, None]
             )
-            return 1
+            buf[:, lo:hi][pad] = ord(" ")
+    mask = np.arange(width) >= (width - 1 - padded)[:, None]
+    return buf[mask].tobytes().decode("ascii")
+
+
+def write_text(
+    output_filename, X, fmt="%.18e", delimiter=" ", header="", chunk_size=1 << 16
+):
+    """Write the 2D array X as text, with the same output as
+    np.savetxt(output_filename, X, fmt=fmt, delimiter=delimiter, header=header)
+
+    Rows are formatted in chunks of about `chunk_size` values and written
+    through a large buffer. Only fixed-point formats "%.<n>f" and
+    "%<width>.<n>f" with a single character delimiter are vectorized
+    with numpy, which is faster than np.savetxt. Other single numeric
+    conversions (e.g. "%.6e") use one %-operation per chunk, which is
+    about as fast as np.savetxt. Anything else uses np.savetxt
+    """
+    n_rows, n_cols = X.shape
+    n_chunk = max(1, chunk_size // max(1, n_cols))
+    chunks = (X[start : start + n_chunk] for start in range(0, n_rows, n_chunk))
+    _write_chunks(output_filename, chunks, fmt, delimiter, header)
+
 
+def _write_chunks(output_filename, chunks, fmt, delimiter, header):
+    """Write the 2D arrays from iterable `chunks` as consecutive rows
+    of one text file, see `write_text`
+    """
+    if _simple_fmt.match(fmt):
+        fixed = _fixed_fmt.match(fmt)
+    else:
+        fixed = None
+    if (fixed is not None) and (len(delimiter) == 1) and (delimiter != "\n"):
+        field_width = int(fixed.group(1) or 0)
+        decimals = int(fixed.group(2))
+    else:
+        decimals = None
+    # Text mode with default encoding, same as np.savetxt
+    with open(output_filename, "w", buffering=1 << 22) as f:
+        if len(header) > 0:
+            f.write("# " + header.replace("\n", "\n# ") + "\n")
+        for chunk in chunks:
+            if decimals is not None:
+                f.write(_format_fixed(chunk, decimals, delimiter, field_width))
+            elif _simple_fmt.match(fmt):
+                row_fmt = delimiter.join([fmt] * chunk.shape[1]) + "\n"
+                f.write((row_fmt * len(chunk)) % tuple(chunk.ravel().tolist()))
+            else:
+                np.savetxt(f, chunk, fmt=fmt, delimiter=delimiter)
+
+
+def _sorted_columns(reader, block_bytes=None, chunk_size=1 << 16):
+    """Yield the exported matrix, wavenumber and one column per spectrum,
+    sorted by wavenumber, in blocks of rows
+
+    The sort permutation is computed from `xdata` only. Blocks of rows
+    of about `block_bytes` (at least `_MIN_BLOCK_ROWS` rows) are gathered
+    from contiguous ranges of spectra of `reader.spectra` (a memmap if
+    the reader uses `mmap`) and transposed in memory, then yielded in
+    pieces of about `chunk_size` values for formatting.
+    If `block_bytes` is None, the whole matrix is yielded at once
+    """
+    wn = reader.xdata
+    spectra = np.reshape(reader.spectra, (-1, len(wn)))
+    dtype = np.result_type(wn, spectra)
+    # Same permutation as sorting the first column of the full matrix
+    order = np.asarray(wn, dtype=dtype).argsort()
+    n_spectra = len(spectra)
+    n_cols = n_spectra + 1
+    if block_bytes is None:
+        n_block = max(1, len(order))
+        n_read = max(1, n_spectra)
+    else:
+        n_block = max(_MIN_BLOCK_ROWS, block_bytes // (n_cols * dtype.itemsize))
+        # Spectra read at once, about `block_bytes` of their values
+        n_read = max(1, block_bytes // (n_block * spectra.itemsize))
+    for start in range(0, len(order), n_block):
+        index = order[start : start + n_block]
+        # Usually a contiguous range, xdata is monotonic
+        lo, hi = int(index.min()), int(index.max()) + 1
+        block = np.empty((len(index), n_cols), dtype=dtype)
+        block[:, 0] = wn[index]
+        for first in range(0, n_spectra, n_read):
+            part = np.asarray(spectra[first : first + n_read, lo:hi])
+            block[:, 1 + first : 1 + first + len(part)] = part[:, index - lo].T
+        if block_bytes is None:
+            yield block
+        else:
+            n_rows = max(1, chunk_size // n_cols)
+            for row in range(0, len(block), n_rows):
+                yield block[row : row + n_rows]
+
+
+def write_spectra(
+    output_filename, reader, fmt="%.4f", delimiter=",", header=None, block_bytes=1 << 25
+):
+    """Write the spectra of `reader` as text, same output as
+    `write_text(output_filename, *handle_spectra(reader, delimiter), ...)`
+
+    The transposed matrix is never built as a whole, only blocks of
+    about `block_bytes` that are read from contiguous ranges of spectra.
+    Open the reader with `mmap=True` so that the spectra are not loaded
+    in memory either.
+    Returns 1 if the spectra cannot be exported
+    """
+    if header is None:
+        header = spectra_header(reader, delimiter=delimiter)
+        if header is None:
+            return 1
+    _write_chunks(
+        output_filename,
+        _sorted_columns(reader, block_bytes=block_bytes),
+        fmt,
+        delimiter,
+        header,
+    )
     return 0
 
 
-def handle_spectra(reader, delimiter=","):
-    """Function to treat single point spectrum
-    return the X matrix using numpy, and header
+def spectra_header(reader, delimiter=",", sidecar=None):
+    """Header of the exported text: information, positions and indices
+    Only the shape of `reader.spectra` is used. Returns None on errors
+
+    If `sidecar` (file name) is given, positions and indices are not
+    listed but refer to the sidecar file, see `write_positions`
     """
     # Wavenumber is alwa
     wn = reader.xdata
@@ -223,85 +748,55 @@ def handle_spectra(reader, delimiter=","):
             "Map Y-dimension: {2} pts; {3:.2f} {unit}{delim}"
         ).format(x_l, x_span, y_l, y_span, unit=reader.xpos_unit.name, delim=delimiter)
 
+    # Positions and indices are formatted at the end, not for a sidecar
+    pos_values = None
     try:
         if len(spectra.shape) == 1:
             # single point
             (l_w,) = spectra.shape
             assert l_w == len(wn)
-            X = np.vstack([wn, spectra]).T
-            header_indices = delimiter.join(["Wavenumber", "point 1"])
+            n_p = 1
             if hasattr(reader, "xpos") and (get_unit(reader) is not None):
-                header_positions = delimiter.join(
-                    [
-                        "Pos. {0} points ({1})".format(
-                            len(reader.xpos), get_unit(reader).name
-                        ),
-                    ]
-                    + get_pos(reader)
+                pos_label = "Pos. {0} points ({1})".format(
+                    len(reader.xpos), get_unit(reader).name
                 )
-                # ["({0:.2f}; {1:.2f}; {2:.2f})".format(x_, y_, z_)
-                #  for x_, y_, z_ in zip(reader.xpos, reader.ypos, reader.zpos)])
+                pos_values = _position_columns(reader)
             else:
-                header_positions = delimiter.join(["Pos. 1 points ", "(0; 0; 0)"])
+                pos_label = "Pos. 1 points "
+                pos_default = "(0; 0; 0)"
+            index_values = np.ones((1, 1))
+            index_prefix, index_sep = "point ", ""
         elif len(spectra.shape) == 2:
             # line or depth scan
             n_p, l_w = spectra.shape
-            X = np.vstack([wn, spectra]).T
+            assert l_w == len(wn)
             if hasattr(reader, "xpos") and (get_unit(reader) is not None):
-                header_positions = delimiter.join(
-                    [
-                        "Pos. {0} points ({1})".format(
-                            len(reader.xpos), get_unit(reader).name
-                        ),
-                    ]
-                    + get_pos(reader)
+                pos_label = "Pos. {0} points ({1})".format(
+                    len(reader.xpos), get_unit(reader).name
                 )
-                # ["({0:.2f}; {1:.2f}; {2:.2f})".format(x_, y_, z_)
-                #  for x_, y_, z_ in zip(reader.xpos, reader.ypos, reader.zpos)])
+                pos_values = _position_columns(reader)
             else:
-                header_positions = delimiter.join(
-                    [
-                        "Pos. {0} points (Unknown dimension)".format(n_p),
-                    ]
-                    + ["({0:.2f}; {1:.2f})".format(0, 0) for i in range(n_p)]
-                )
-            header_indices = delimiter.join(
-                [
-                    "Wavenumber",
-                ]
-                + ["point {:d}".format(i + 1) for i in range(n_p)]
-            )
+                pos_label = "Pos. {0} points (Unknown dimension)".format(n_p)
+                pos_default = delimiter.join(["(0.00; 0.00)"] * n_p)
+            index_values = np.arange(1, n_p + 1)[:, None]
+            index_prefix, index_sep = "point ", ""
         elif len(spectra.shape) == 3:
             # mapping
             r, c, l_w = spectra.shape
             assert l_w == len(wn)
-            X = np.vstack([wn, spectra.reshape(r * c, l_w)]).T
-            header_positions = delimiter.join(
-                [
-                    "Pos.  {0} points ({1})".format(
-                        len(reader.xpos), reader.xpos_unit.name
-                    ),
-                ]
-                + get_pos(reader)
-            )
-            # ["({0:.2f}; {1:.2f}; {2:.2f})".format(x_, y_, z_)
-            # for x_, y_, z_ in zip(reader.xpos, reader.ypos, reader.zpos)])
-            header_indices = delimiter.join(
-                [
-                    "Wavenumber",
-                ]
-                + [
-                    "row {:d} column {:d}".format(i + 1, j + 1)
-                    for i in range(r)
-                    for j in range(c)
-                ]
+            n_p = r * c
+            pos_label = "Pos.  {0} points ({1})".format(
+                len(reader.xpos), reader.xpos_unit.name
             )
+            pos_values = _position_columns(reader)
+            index_values = _grid_indices(r, c) + 1
+            index_prefix, index_sep = "row ", " column "
         else:
             print(
                 ("There seems to be something wrong " "with the spectral file. Abort!"),
                 file=sys.stderr,
             )
-            return 1
+            return None
     except AssertionError:
         print(
             (
@@ -310,9 +805,22 @@ def handle_spectra(reader, delimiter=","):
             ),
             file=sys.stderr,
         )
+        return None
 
-    # Sort the ndarray according to 0st
-    X = X[X[:, 0].argsort()]
+    if sidecar is None:
+        if pos_values is not None:
+            pos_default = _join_fixed(pos_values, 2, "(", "; ", ")", delimiter)
+        header_positions = delimiter.join([pos_label, pos_default])
+        index_text = _join_fixed(
+            index_values, 0, index_prefix, index_sep, "", delimiter
+        )
+        header_indices = delimiter.join(["Wavenumber", index_text])
+    else:
+        # Columns are the spectra in the order of the sidecar lines
+        header_positions = delimiter.join([pos_label, "see {0}".format(sidecar)])
+        header_indices = delimiter.join(
+            ["Wavenumber", "points 1-{0}, see {1}".format(n_p, sidecar)]
+        )
     header = "\n".join(
         [
             header_info,
@@ -320,6 +828,69 @@ def handle_spectra(reader, delimiter=","):
             header_indices,
         ]
     )
+    return header
+
+
+def _grid_indices(n_rows, n_cols):
+    """(row, column) of the spectra of a mapping, in row-first order"""
+    rows, cols = np.divmod(np.arange(n_rows * n_cols), n_cols)
+    return np.column_stack([rows, cols])
+
+
+def write_positions(
+    output_filename, reader, delimiter=",", decimals=2, chunk_size=1 << 16
+):
+    """Write the indices and positions of the spectra as text, one line
+    per spectrum in the order of the columns of `write_spectra`.
+    Columns are point (from 1), row and column (from 1, mappings only)
+    and x, y, z (z if not all zero, only if the file has positions).
+    The names in the header line have no spaces, e.g. x_Micron, so that
+    they also split with a space delimiter
+    """
+    spectra = reader.spectra
+    n_p = 1 if spectra.ndim == 1 else int(np.prod(spectra.shape[:-1]))
+    names = ["point"]
+    if spectra.ndim == 3:
+        names += ["row", "column"]
+    if hasattr(reader, "xpos") and (get_unit(reader) is not None):
+        positions = _position_columns(reader)
+        unit = get_unit(reader).name
+        names += [
+            "{0}_{1}".format(d, unit) for d in ("x", "y", "z")[: positions.shape[1]]
+        ]
+    else:
+        positions = None
+    with open(output_filename, "w", buffering=1 << 22) as f:
+        f.write("# " + delimiter.join(names) + "\n")
+        n_chunk = max(1, chunk_size // len(names))
+        for start in range(0, n_p, n_chunk):
+            index = np.arange(start, min(start + n_chunk, n_p))
+            ints = (index + 1)[:, None]
+            if spectra.ndim == 3:
+                grid = np.column_stack(np.divmod(index, spectra.shape[1])) + 1
+                ints = np.column_stack([ints, grid])
+            lines = _format_fixed(ints, 0, delimiter)
+            if positions is not None:
+                floats = _format_fixed(positions[index], decimals, delimiter)
+                # Concatenate the lines of both parts
+                lines = "\n".join(
+                    map(
+                        delimiter.join,
+                        zip(lines[:-1].split("\n"), floats[:-1].split("\n")),
+                    )
+                )
+                lines += "\n"
+            f.write(lines)
+
+
+def handle_spectra(reader, delimiter=","):
+    """Function to treat single point spectrum
+    return the X matrix sorted by wavenumber using numpy, and header
+    """
+    header = spectra_header(reader, delimiter=delimiter)
+    if header is None:
+        return 1
+    X = next(_sorted_columns(reader))
     return X, header
 
 
@@ -327,11 +898,11 @@ def extract_img(reader, output_filename):
     """Handle image file"""
     try:
         import matplotlib.pyplot as plt
-        import matplotlib.image as mpimg
     except ImportError as e:
         print("Error when importing matplotlib.\n{0}".format(e), file=sys.stderr)
         return 1
-    img = mpimg.imread(reader.img, format="jpg")
+    # Decoded once and cached by the reader
+    img = reader.get_img()
     img_x0, img_y0 = reader.img_origins
     img_w, img_h = reader.img_dimensions
     map_x = reader.xpos
@@ -0,0 +1,288 @@
+# Binary output formats of wdf-export
+# Spectra are streamed from the DATA block in chunks of whole map rows,
+# so the memory used does not depend on the size of the wdf file
+import json
+import os
+import shutil
+import zipfile
+import numpy
+from contextlib import contextmanager
+from .lazy import LazySpectra
+from .utils import json_value
+
+# Target size of the chunks of `spectra` in bytes
+_CHUNK_BYTES = 1 << 22
+
+
+def metadata(reader):
+    """Header, mapping information and units of a reader, as a dict of
+    values that can be serialized to json
+    """
+    meta = {}
+    for key in (
+        "title",
+        "username",
+        "application_name",
+        "measurement_type",
+        "scan_type",
+        "laser_length",
+        "count",
+        "capacity",
+        "point_per_spectrum",
+        "accumulation_count",
+        "spectral_unit",
+        "xlist_type",
+        "xlist_unit",
+        "is_completed",
+    ):
+        meta[key] = json_value(getattr(reader, key))
+    meta["application_version"] = ".".join(str(v) for v in reader.application_version)
+    if "WMAP" in reader.block_info:
+        meta["map_shape"] = list(reader.map_shape)
+        meta["map_info"] = {k: json_value(v) for k, v in reader.map_info.items()}
+    return meta
+
+
+def _layout(reader):
+    """Shape of `spectra` and number of spectra per chunk
+    A chunk always holds whole rows of a 2D mapping
+    """
+    lazy = LazySpectra(reader)
+    pps = reader.point_per_spectrum
+    n_spectra = max(1, _CHUNK_BYTES // (4 * pps))
+    if lazy.grid:
+        spectra_w = lazy.shape[1]
+        n_spectra = max(1, n_spectra // spectra_w) * spectra_w
+        n_spectra = min(n_spectra, lazy.shape[0] * spectra_w)
+    else:
+        n_spectra = max(1, min(n_spectra, reader.count))
+    return lazy, n_spectra
+
+
+def _chunks(reader, lazy, n_spectra):
+    """Yield (start, indices, spectra, positions) of the chunks, see
+    `WDFReader.iter_spectra`. `start` is the position of the chunk on
+    the first axis of `lazy`
+    """
+    for indices, spectra, positions in reader.iter_spectra(
+        chunk_size=n_spectra, as_grid_rows=lazy.grid
+    ):
+        if lazy.grid:
+            yield int(indices[0, 0]) // lazy.shape[1], indices, spectra, positions
+        else:
+            yield int(indices[0]), indices, spectra, positions
+
+
+def _origin_list(reader):
+    if "ORGN" in reader.block_info:
+        return reader.origin_list
+    return None
+
+
+@contextmanager
+def _atomic_output(output_filename):
+    """Temporary path next to `output_filename`, moved to it when the
+    block succeeds and removed otherwise. Readers never see partial output
+    """
+    tmp = "{0}.{1}.tmp".format(output_filename, os.getpid())
+    try:
+        yield tmp
+    except BaseException:
+        _remove(tmp)
+        raise
+    if os.path.isdir(output_filename):
+        # Directory stores (zarr) cannot be replaced in one step
+        shutil.rmtree(output_filename)
+    os.replace(tmp, output_filename)
+
+
+def _remove(path):
+    """Remove a file or directory if it exists"""
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def write_npz(reader, output_filename):
+    """Write an uncompressed .npz file, same layout as numpy.savez, with
+    arrays `spectra`, `xdata`, `origin_list` (if the file has ORGN) and
+    `metadata` (json string, use `json.loads(str(npz["metadata"]))`)
+    """
+    lazy, n_spectra = _layout(reader)
+    with _atomic_output(output_filename) as tmp:
+        _write_npz(reader, tmp, lazy, n_spectra)
+
+
+def _write_npz(reader, tmp, lazy, n_spectra):
+    """Write the .npz file to path `tmp`, see `write_npz`"""
+    with zipfile.ZipFile(tmp, mode="w", compression=zipfile.ZIP_STORED) as zf:
+        with zf.open("spectra.npy", mode="w", force_zip64=True) as f:
+            numpy.lib.format.write_array_header_1_0(
+                f,
+                dict(
+                    descr=numpy.lib.format.dtype_to_descr(lazy.dtype),
+                    fortran_order=False,
+                    shape=lazy.shape,
+                ),
+            )
+            for start, indices, spectra, positions in _chunks(reader, lazy, n_spectra):
+                f.write(numpy.ascontiguousarray(spectra, dtype=lazy.dtype).data)
+        arrays = dict(
+            xdata=reader.xdata,
+            metadata=numpy.array(json.dumps(metadata(reader))),
+        )
+        origin_list = _origin_list(reader)
+        if origin_list is not None:
+            arrays["origin_list"] = origin_list
+        for name, array in arrays.items():
+            with zf.open(name + ".npy", mode="w", force_zip64=True) as f:
+                numpy.lib.format.write_array(f, numpy.asanyarray(array))
+
+
+def write_hdf5(reader, output_filename):
+    """Write an HDF5 file with datasets `spectra` (chunked by map rows),
+    `xdata` and `origin_list` (if the file has ORGN). The metadata are
+    attributes of the root group, `map_info` as json string. Requires h5py
+    """
+    # Optional dependencies are imported when used, they are slow to import
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError("h5py is needed for the HDF5 format!")
+    lazy, n_spectra = _layout(reader)
+    meta = metadata(reader)
+    with _atomic_output(output_filename) as tmp, h5py.File(tmp, "w") as h5:
+        dataset = h5.create_dataset(
+            "spectra",
+            shape=lazy.shape,
+            dtype=lazy.dtype,
+            chunks=_chunk_shape(lazy, n_spectra),
+        )
+        for start, indices, spectra, positions in _chunks(reader, lazy, n_spectra):
+            dataset[start : start + len(spectra)] = spectra
+        h5["xdata"] = reader.xdata
+        origin_list = _origin_list(reader)
+        if origin_list is not None:
+            h5["origin_list"] = origin_list
+        for key, value in meta.items():
+            if isinstance(value, dict):
+                value = json.dumps(value)
+            h5.attrs[key] = value
+
+
+def write_zarr(reader, output_filename):
+    """Write a zarr directory store with arrays `spectra` (chunked by map
+    rows), `xdata` and `origin_list` (if the file has ORGN). The metadata
+    are attributes of the root group. Requires zarr
+    """
+    try:
+        import zarr
+    except ImportError:
+        raise ImportError("zarr is needed for the zarr format!")
+    lazy, n_spectra = _layout(reader)
+    with _atomic_output(output_filename) as tmp:
+        _write_zarr(reader, tmp, lazy, n_spectra)
+
+
+def _write_zarr(reader, tmp, lazy, n_spectra):
+    """Write the zarr store to path `tmp`, see `write_zarr`"""
+    import zarr
+
+    group = zarr.open_group(tmp, mode="w")
+    # zarr>=3 renamed create_dataset to create_array
+    create = getattr(group, "create_array", None) or group.create_dataset
+    dataset = create(
+        name="spectra",
+        shape=lazy.shape,
+        chunks=_chunk_shape(lazy, n_spectra),
+        dtype=lazy.dtype,
+    )
+    for start, indices, spectra, positions in _chunks(reader, lazy, n_spectra):
+        dataset[start : start + len(spectra)] = spectra
+    arrays = dict(xdata=reader.xdata)
+    origin_list = _origin_list(reader)
+    if origin_list is not None:
+        # Structured dtypes are not portable across zarr versions
+        for name in origin_list.dtype.names:
+            arrays["origin_list/" + name] = origin_list[name]
+    for name, array in arrays.items():
+        create(name=name, shape=array.shape, dtype=array.dtype)[...] = array
+    group.attrs.update(metadata(reader))
+
+
+def write_parquet(reader, output_filename):
+    """Write a Parquet table with one row per spectrum and the columns
+    `index`, `row` and `column` (2D mappings), the ORGN columns and
+    `spectrum` (fixed size list of float32). Each row group holds whole
+    map rows. `xdata` and the metadata are json in the schema metadata
+    under the keys b"xdata" and b"metadata". Requires pyarrow
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("pyarrow is needed for the Parquet format!")
+    lazy, n_spectra = _layout(reader)
+    pps = reader.point_per_spectrum
+    fields = [("index", pyarrow.int64())]
+    if lazy.grid:
+        fields += [("row", pyarrow.int32()), ("column", pyarrow.int32())]
+    origin_list = _origin_list(reader)
+    if origin_list is not None:
+        fields += [
+            (name, pyarrow.from_numpy_dtype(origin_list.dtype[name]))
+            for name in origin_list.dtype.names
+        ]
+    fields.append(("spectrum", pyarrow.list_(pyarrow.float32(), pps)))
+    schema = pyarrow.schema(
+        fields,
+        metadata={
+            b"xdata": json.dumps(reader.xdata.tolist()).encode("utf8"),
+            b"metadata": json.dumps(metadata(reader)).encode("utf8"),
+        },
+    )
+    with _atomic_output(output_filename) as tmp, pyarrow.parquet.ParquetWriter(
+        tmp, schema
+    ) as writer:
+        for start, indices, spectra, positions in _chunks(reader, lazy, n_spectra):
+            spectra = numpy.reshape(spectra, (-1, pps))
+            index = numpy.reshape(indices, -1).astype("int64")
+            columns = [index]
+            if lazy.grid:
+                columns += [
+                    (index // lazy.shape[1]).astype("int32"),
+                    (index % lazy.shape[1]).astype("int32"),
+                ]
+            if positions is not None:
+                positions = numpy.reshape(positions, -1)
+                columns += [positions[name] for name in origin_list.dtype.names]
+            columns = [pyarrow.array(c) for c in columns]
+            columns.append(
+                pyarrow.FixedSizeListArray.from_arrays(
+                    pyarrow.array(numpy.reshape(spectra, -1)), pps
+                )
+            )
+            writer.write_table(
+                pyarrow.Table.from_arrays(columns, schema=schema),
+                row_group_size=len(spectra),
+            )
+
+
+def _chunk_shape(lazy, n_spectra):
+    """Storage chunks of `spectra`, whole map rows and all points"""
+    if lazy.shape[0] == 0:
+        return None
+    if lazy.grid:
+        return (n_spectra // lazy.shape[1],) + lazy.shape[1:]
+    return (n_spectra,) + lazy.shape[1:]
+
+
+# Suffix -> writer of the binary formats
+FORMATS = {
+    ".npz": write_npz,
+    ".h5": write_hdf5,
+    ".hdf5": write_hdf5,
+    ".zarr": write_zarr,
+    ".parquet": write_parquet,
+}
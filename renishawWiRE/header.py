@@ -0,0 +1,141 @@
+# Fast decoding of the WDF1 file header
+# The first 0x200 bytes of a wdf file are decoded with one read
+# and a precompiled struct layout, without parsing other blocks
+import struct
+from .types import Offsets, ScanType, MeasurementType, UnitType
+from .utils import convert_wl
+
+
+def _pad(start, end):
+    """Padding bytes between two offsets in the header"""
+    return "{0}x".format(end - start) if end > start else ""
+
+
+# Layout of the WDF1 block, see WDFReader._parse_header
+_block_fmt = "4sIQ"
+_measurement_fmt = "IQQIIII24s4HII"
+_spectral_fmt = "If"
+_file_fmt = "{0}s{1}s".format(
+    Offsets.usr_name - Offsets.file_info, Offsets.data_block - Offsets.usr_name
+)
+HEADER_STRUCT = struct.Struct(
+    "<"
+    + _block_fmt
+    + _pad(struct.calcsize("<" + _block_fmt), Offsets.measurement_info)
+    + _measurement_fmt
+    + _pad(
+        Offsets.measurement_info + struct.calcsize("<" + _measurement_fmt),
+        Offsets.spectral_info,
+    )
+    + _spectral_fmt
+    + _pad(
+        Offsets.spectral_info + struct.calcsize("<" + _spectral_fmt),
+        Offsets.file_info,
+    )
+    + _file_fmt
+)
+assert HEADER_STRUCT.size == Offsets.data_block
+
+
+def _utf8(b):
+    """Decode a fixed-size utf8 field"""
+    return b.decode("utf8").replace("\x00", "")
+
+
+def decode_header(buf):
+    """Decode the WDF1 header from the first 0x200 bytes of a wdf file
+
+    Returns a dict with the same names as the `WDFReader` attributes
+    """
+    try:
+        (
+            block_ID,
+            block_UID,
+            block_len,
+            point_per_spectrum,
+            capacity,
+            count,
+            accumulation_count,
+            ylist_length,
+            xlist_length,
+            data_origin_count,
+            application_name,
+            v0,
+            v1,
+            v2,
+            v3,
+            scan_type,
+            measurement_type,
+            spectral_unit,
+            laser_wavenumber,
+            username,
+            title,
+        ) = HEADER_STRUCT.unpack_from(buf)
+    except struct.error:
+        raise ValueError("The wdf file format is incorrect!")
+    # First block must be "WDF1"
+    if (
+        (block_ID != b"WDF1")
+        or (block_UID != 0 and block_UID != 1)
+        or (block_len != Offsets.data_block)
+    ):
+        raise ValueError("The wdf file format is incorrect!")
+    return dict(
+        point_per_spectrum=point_per_spectrum,
+        capacity=capacity,
+        count=count,
+        # If count < capacity, this measurement is not completed
+        is_completed=count == capacity,
+        accumulation_count=accumulation_count,
+        ylist_length=ylist_length,
+        xlist_length=xlist_length,
+        data_origin_count=data_origin_count,
+        application_name=_utf8(application_name),  # Must be "WiRE"
+        application_version=[v0, v1, v2, v3],
+        scan_type=ScanType(scan_type),
+        measurement_type=MeasurementType(measurement_type),
+        spectral_unit=UnitType(spectral_unit),
+        laser_length=convert_wl(laser_wavenumber),  # in nm
+        username=_utf8(username),
+        title=_utf8(title),
+    )
+
+
+def read_header(file_name):
+    """Read only the WDF1 header of a wdf file
+
+    Args:
+    file_name (str or pathlib.Path) : Path of the wdf file
+
+    Returns a dict with header fields, e.g. `count`, `capacity`,
+    `scan_type`, `measurement_type`, `laser_length`, `title` and `username`
+    """
+    with open(str(file_name), "rb", buffering=0) as f:
+        buf = f.read(Offsets.data_block)
+    return decode_header(buf)
+
+
+def read_headers(file_names, errors="raise"):
+    """Read the WDF1 headers of many wdf files
+
+    Args:
+    file_names : Iterable of paths
+    errors (str) : What to do with files that cannot be read
+                   "raise": raise the exception
+                   "return": yield the exception in place of the header
+                   "skip": leave the file out
+
+    Yields (file_name, header) for every file in the iterable `file_names`
+    """
+    if errors not in ("raise", "return", "skip"):
+        raise ValueError("errors must be raise, return or skip!")
+    for file_name in file_names:
+        try:
+            header = read_header(file_name)
+        except (OSError, ValueError) as e:
+            if errors == "raise":
+                raise
+            if errors == "skip":
+                continue
+            header = e
+        yield file_name, header
@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+"""Watch a directory tree and ingest wdf files as they are written
+   usage:
+   wdf-ingest <directory> -o <output> [-f npz|h5] [-j N]
+"""
+import os
+import sys
+import time
+import threading
+from argparse import ArgumentParser, RawTextHelpFormatter
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path
+from .formats import write_npz
+from .wdfReader import WDFReader
+
+
+class Sink(object):
+    """Base class of ingest sinks
+
+    `name` is the path of the wdf file relative to the watched directory.
+    Calls are serialized by `Ingest`, sinks need not be thread-safe.
+    """
+
+    def update(self, name, reader, start, spectra):
+        """New spectra `start` to `start + len(spectra) - 1` of a file,
+        as array of shape (n, point_per_spectrum). `start` is 0 when
+        a file is (re-)ingested from the beginning
+        """
+        pass
+
+    def finish(self, name, reader):
+        """The measurement in the file is completed"""
+        pass
+
+    def close(self):
+        pass
+
+
+class CallbackSink(Sink):
+    """Call `on_update(name, reader, start, spectra)` for new spectra,
+    and `on_finish(name, reader)` for completed files if given
+    """
+
+    def __init__(self, on_update, on_finish=None):
+        self.on_update = on_update
+        self.on_finish = on_finish
+
+    def update(self, name, reader, start, spectra):
+        self.on_update(name, reader, start, spectra)
+
+    def finish(self, name, reader):
+        if self.on_finish is not None:
+            self.on_finish(name, reader)
+
+
+class NpzSink(Sink):
+    """Write `<output_dir>/<name>.npz` once a measurement is completed,
+    see `formats.write_npz` for the arrays. The spectra are streamed
+    from the file in chunks, not loaded at once
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+
+    def finish(self, name, reader):
+        output = (self.output_dir / name).with_suffix(".npz")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        # Written to a temporary file first, readers never see partial output
+        write_npz(reader, output)
+
+
+class HDF5Sink(Sink):
+    """Append spectra to one HDF5 file, with one group per wdf file
+    containing the resizable dataset `spectra` (n, point_per_spectrum),
+    `xdata`, `origin_list` (if the file has ORGN) and the header as
+    attributes. Requires h5py
+    """
+
+    def __init__(self, file_name):
+        # Imported here, h5py is slow to import and optional
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("h5py is needed for HDF5Sink!")
+        self.h5 = h5py.File(str(file_name), "a")
+
+    def update(self, name, reader, start, spectra):
+        if (start == 0) and (name in self.h5):
+            del self.h5[name]
+        if name not in self.h5:
+            group = self.h5.create_group(name)
+            pps = reader.point_per_spectrum
+            group.create_dataset(
+                "spectra",
+                shape=(0, pps),
+                maxshape=(reader.capacity, pps),
+                dtype="float32",
+                chunks=(max(1, min(reader.capacity, 65536 // pps)), pps),
+            )
+            group["xdata"] = reader.xdata
+            for key in ("title", "username", "capacity", "point_per_spectrum"):
+                group.attrs[key] = getattr(reader, key)
+            group.attrs["measurement_type"] = reader.measurement_type.name
+            group.attrs["scan_type"] = reader.scan_type.name
+            group.attrs["laser_length"] = reader.laser_length
+        group = self.h5[name]
+        dataset = group["spectra"]
+        dataset.resize(start + len(spectra), axis=0)
+        dataset[start:] = spectra
+        group.attrs["count"] = start + len(spectra)
+        self.h5.flush()
+
+    def finish(self, name, reader):
+        group = self.h5[name]
+        if "ORGN" in reader.block_info:
+            if "origin_list" in group:
+                del group["origin_list"]
+            group["origin_list"] = reader.origin_list
+        group.attrs["is_completed"] = True
+        self.h5.flush()
+
+    def close(self):
+        self.h5.close()
+
+
+class _FileState(object):
+    """Reader and progress of a file being ingested"""
+
+    def __init__(self):
+        self.reader = None
+        self.n_done = 0
+        self.stat = None
+
+
+class Ingest(object):
+    """Ingest wdf files from a directory tree into a sink
+
+    Args:
+    root (str or pathlib.Path) : Directory to watch, searched recursively
+    sink (Sink) : Receives the spectra, see `Sink`
+    pattern (str) : File name pattern of the wdf files
+    workers (int) : Number of threads parsing the files
+    max_pending (int) : Max number of files queued or being parsed.
+                        Scanning blocks when the queue is full.
+                        Default is 2 * workers
+    chunk_size (int) : Max number of spectra passed to `Sink.update` at
+                       once, new spectra are read in chunks of this size
+
+    Files are detected by size and mtime. New files are read completely.
+    For files with `is_completed` False, the reader is kept open and only
+    the appended spectra are read (see `WDFReader.refresh`) when the file
+    grows. A completed file that changes again is read from the start.
+    Files that cannot be parsed yet (e.g. still being copied) are retried
+    when they change.
+
+    Use `poll()` for a single scan, or `run()` to keep watching.
+    """
+
+    def __init__(
+        self, root, sink, pattern="*.wdf", workers=4, max_pending=None, chunk_size=4096
+    ):
+        self.root = Path(root)
+        self.sink = sink
+        self.pattern = pattern
+        self.chunk_size = chunk_size
+        self.errors = {}  # name -> last exception
+        self._files = {}  # name -> _FileState
+        self._running = set()  # names in the queue or being parsed
+        self._lock = threading.Lock()
+        self._sink_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * workers)
+
+    def scan(self):
+        """Names and stats of wdf files that are new or changed"""
+        changed = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if not fnmatch(filename, self.pattern):
+                    continue
+                path = Path(dirpath) / filename
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                name = path.relative_to(self.root).as_posix()
+                stat = (st.st_size, st.st_mtime_ns)
+                state = self._files.get(name, None)
+                if (state is None) or (state.stat != stat):
+                    changed.append((name, stat))
+        return changed
+
+    def poll(self):
+        """Scan once and queue the changed files
+        Returns the number of queued files
+        """
+        n_queued = 0
+        for name, stat in self.scan():
+            with self._lock:
+                if name in self._running:
+                    # Checked again at the next scan
+                    continue
+                self._running.add(name)
+            # Back-pressure, wait for a free slot
+            self._slots.acquire()
+            future = self._pool.submit(self.__ingest, name, stat)
+            future.add_done_callback(lambda f: self._slots.release())
+            n_queued += 1
+        return n_queued
+
+    def run(self, interval=5.0, stop_event=None, max_scans=None):
+        """Poll every `interval` seconds until `stop_event` (threading.Event)
+        is set or after `max_scans` scans
+        """
+        n_scans = 0
+        while (stop_event is None) or (not stop_event.is_set()):
+            self.poll()
+            n_scans += 1
+            if (max_scans is not None) and (n_scans >= max_scans):
+                break
+            if stop_event is not None:
+                stop_event.wait(interval)
+            else:
+                time.sleep(interval)
+
+    def __ingest(self, name, stat):
+        """Read the new spectra of one file and pass them to the sink"""
+        state = self._files.get(name, None) or _FileState()
+        reader = state.reader
+        try:
+            if (reader is not None) and (stat[0] < state.stat[0]):
+                # Truncated or replaced, start again
+                reader.close()
+                reader = None
+            if reader is None:
+                reader = WDFReader(self.root / name)
+                state.n_done = 0
+            else:
+                reader.refresh()
+            # Memory is bounded by the chunk size, not by the new spectra
+            for indices, spectra, positions in reader.iter_spectra(
+                chunk_size=self.chunk_size, start=state.n_done
+            ):
+                with self._sink_lock:
+                    self.sink.update(name, reader, int(indices[0]), spectra)
+                state.n_done = int(indices[-1]) + 1
+            if reader.is_completed:
+                with self._sink_lock:
+                    self.sink.finish(name, reader)
+                reader.close()
+                reader = None
+            state.reader = reader
+            state.stat = stat
+            self._files[name] = state
+            self.errors.pop(name, None)
+        except Exception as e:
+            # Probably still being written, retried when it changes
+            self.errors[name] = e
+            if (reader is not None) and (reader is not state.reader):
+                reader.close()
+            state.stat = stat
+            self._files[name] = state
+        finally:
+            with self._lock:
+                self._running.discard(name)
+
+    def close(self):
+        """Wait for the queued files, close readers and the sink"""
+        self._pool.shutdown(wait=True)
+        for state in self._files.values():
+            if state.reader is not None:
+                state.reader.close()
+                state.reader = None
+        self.sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class _Report(Sink):
+    """Print progress, then forward to `sink`"""
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def update(self, name, reader, start, spectra):
+        print("{0}: spectra {1}-{2}".format(name, start, start + len(spectra)))
+        self.sink.update(name, reader, start, spectra)
+
+    def finish(self, name, reader):
+        print("{0}: completed".format(name))
+        self.sink.finish(name, reader)
+
+    def close(self):
+        self.sink.close()
+
+
+def main():
+    """Command line interface"""
+    parser = ArgumentParser(
+        description=(
+            "Watch a directory for Renishaw wdf files and ingest new spectra.\n"
+            "Files still being measured are followed until completed."
+        ),
+        formatter_class=RawTextHelpFormatter,
+    )
+    parser.add_argument("directory", help="Directory to watch, recursively")
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help=(
+            "Output directory for npz format,\n"
+            "or output file name for h5 format"
+        ),
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        default="npz",
+        help=(
+            "format of the output, valid values\n"
+            "\tnpz (one file per measurement, written when completed)\n"
+            "\th5 (one HDF5 file, spectra appended as they come, needs h5py)"
+        ),
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=4, help="number of parsing threads"
+    )
+    parser.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=5.0,
+        help="seconds between two scans of the directory",
+    )
+    parser.add_argument(
+        "--once", action="store_true", help="scan only once and exit"
+    )
+
+    args = parser.parse_args()
+    root = Path(args.directory).expanduser().resolve()
+    if not root.is_dir():
+        print(
+            "The directory {0} does not exist. Abort!".format(root.as_posix()),
+            file=sys.stderr,
+        )
+        return 1
+    if args.format == "npz":
+        sink = NpzSink(Path(args.output).expanduser())
+    elif args.format == "h5":
+        try:
+            sink = HDF5Sink(Path(args.output).expanduser())
+        except ImportError as e:
+            print("{0} Abort!".format(e), file=sys.stderr)
+            return 1
+    else:
+        print("Only npz and h5 formats are allowed! Abort.", file=sys.stderr)
+        return 1
+
+    with Ingest(root, _Report(sink), workers=args.jobs) as ingest:
+        try:
+            ingest.run(interval=args.interval, max_scans=1 if args.once else None)
+        except KeyboardInterrupt:
+            pass
+    for name, e in ingest.errors.items():
+        print("{0}: not ingested, {1}".format(name, e), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Chunked lazy view of the spectra in the DATA block
+# Nothing is read until the array is indexed, which makes it usable
+# as the source of out-of-core array libraries such as dask
+import numpy
+
+
+class LazySpectra(object):
+    """Array-like view of `reader.spectra` that reads on indexing
+
+    Args:
+    reader (WDFReader) : The reader of the wdf file
+
+    Attributes:
+    shape (tuple) : (spectra_h, spectra_w, point_per_spectrum) for
+                    a completed 2D mapping, otherwise
+                    (count, point_per_spectrum)
+    dtype (numpy.dtype) : float32
+    grid (bool) : True if the spectra are shaped as a mapping grid
+
+    Indexing returns numpy arrays, e.g. `lazy[10:20, :, 100:200]`.
+    Only the selected spectra are read, see `WDFReader.read_spectra`.
+    Chunks that cover whole rows (and all points) of a mapping are
+    contiguous byte ranges in the DATA block.
+    """
+
+    dtype = numpy.dtype("float32")
+
+    def __init__(self, reader):
+        self.reader = reader
+        pps = reader.point_per_spectrum
+        self.grid = False
+        if reader.is_completed and ("WMAP" in reader.block_info):
+            spectra_w, spectra_h = reader.map_shape
+            if (
+                spectra_w * spectra_h == reader.count
+                and spectra_w > 1
+                and spectra_h > 1
+            ):
+                self.grid = True
+        if self.grid:
+            self.shape = (spectra_h, spectra_w, pps)
+        else:
+            self.shape = (reader.count, pps)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(numpy.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if len(key) > self.ndim:
+            raise IndexError("Too many indices for the spectra!")
+        # Spectra are read as a whole, points are selected afterwards
+        n_spectra_axes = self.ndim - 1
+        key = key + (slice(None),) * (self.ndim - len(key))
+        selection = key[:n_spectra_axes]
+        if self.grid:
+            data = self.reader.read_spectra(selection)
+        else:
+            data = self.reader.read_spectra(selection[0])
+        return data[..., key[-1]]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+    def chunk_shape(self, chunk_size=4096):
+        """Chunk shape with at most `chunk_size` spectra (at least one row
+        of a mapping), aligned to whole rows and all points
+        """
+        if self.grid:
+            spectra_h, spectra_w, pps = self.shape
+            n_rows = min(spectra_h, max(1, chunk_size // spectra_w))
+            return (n_rows, spectra_w, pps)
+        count, pps = self.shape
+        return (max(1, min(count, chunk_size)), pps)
+
+
+def to_dask(reader, chunk_size=4096):
+    """Spectra of `reader` as a dask array, see `WDFReader.to_dask`"""
+    # Imported here, dask is slow to import and optional
+    try:
+        import dask.array as da
+    except ImportError:
+        raise ImportError("dask is needed for WDFReader.to_dask!")
+    lazy = LazySpectra(reader)
+    return da.from_array(
+        lazy,
+        chunks=lazy.chunk_shape(chunk_size),
+        # WDFReader.read_spectra is thread-safe, no lock is needed
+        lock=False,
+        asarray=False,
+        meta=numpy.empty((0,) * lazy.ndim, dtype=lazy.dtype),
+    )
@@ -0,0 +1,183 @@
+# Hand-off of parsed arrays to other processes via shared memory
+# The DATA block is read directly into a shared memory segment, workers
+# attach zero-copy views with a small picklable handle
+import threading
+import numpy
+from .lazy import LazySpectra
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+_attach_lock = threading.Lock()
+
+
+def _attach_untracked(name):
+    """Attach a segment without registering it in the resource tracker
+    (Python < 3.13, which has no track=False)
+
+    Unregistering after attaching is not enough: workers started by
+    multiprocessing share the tracker of the owner, and would remove
+    the owner's registration. The registration is skipped instead
+    """
+    register = resource_tracker.register
+
+    def _register(res_name, rtype):
+        if (rtype != "shared_memory") or (res_name.lstrip("/") != name.lstrip("/")):
+            register(res_name, rtype)
+
+    with _attach_lock:
+        resource_tracker.register = _register
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _open_segment(name=None, size=0):
+    """Create (name is None) or attach a shared memory segment"""
+    if shared_memory is None:
+        raise ImportError("multiprocessing.shared_memory needs Python >= 3.8!")
+    if name is None:
+        return shared_memory.SharedMemory(create=True, size=max(1, size))
+    try:
+        # Attached segments are not tracked, only the owner unlinks them
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13
+        return _attach_untracked(name)
+
+
+class SharedHandle(object):
+    """Picklable description of the shared arrays of a wdf file
+
+    Send the handle to worker processes and attach there:
+
+        with handle.attach() as data:
+            data.spectra[i, j]
+
+    Attributes:
+    specs (dict) : name -> (segment name, shape, dtype) of each array
+    """
+
+    def __init__(self, specs):
+        self.specs = specs
+
+    def attach(self):
+        """Attach zero-copy views of the shared arrays, see `SharedArrays`"""
+        return SharedArrays(self)
+
+
+class SharedArrays(object):
+    """Views of shared arrays of a wdf file
+
+    Attributes:
+    spectra (numpy.array) : Same shape as `LazySpectra`, i.e.
+                            (h, w, point_per_spectrum) for a 2D mapping,
+                            otherwise (count, point_per_spectrum)
+    xdata (numpy.array) : x-axis data
+    origin_list (numpy.array) : ORGN columns as structured array, if present
+    xpos, ypos, zpos (numpy.array) : Views of `origin_list` columns, if present
+
+    `close()` releases the views of this process. Arrays obtained from
+    the object must not be used after closing.
+    """
+
+    def __init__(self, handle, segments=None):
+        self.handle = handle
+        self._segments = []
+        self.arrays = {}
+        try:
+            for i, (name, (seg_name, shape, dtype)) in enumerate(
+                handle.specs.items()
+            ):
+                if segments is None:
+                    segment = _open_segment(seg_name)
+                else:
+                    segment = segments[i]
+                self._segments.append(segment)
+                self.arrays[name] = numpy.ndarray(shape, dtype=dtype, buffer=segment.buf)
+        except Exception:
+            self.close()
+            raise
+        origin_list = self.arrays.get("origin_list", None)
+        if origin_list is not None:
+            for attr, field in (
+                ("xpos", "Spatial_X"),
+                ("ypos", "Spatial_Y"),
+                ("zpos", "Spatial_Z"),
+            ):
+                if field in origin_list.dtype.names:
+                    self.arrays[attr] = origin_list[field]
+
+    def __getattr__(self, name):
+        arrays = self.__dict__.get("arrays", {})
+        if name not in arrays:
+            raise AttributeError(
+                "{0} object has no attribute {1}".format(type(self).__name__, name)
+            )
+        return arrays[name]
+
+    def close(self):
+        # Views keep the buffers exported, drop them before closing
+        self.arrays = {}
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SharedSpectra(SharedArrays):
+    """Spectra, xdata and ORGN arrays of a reader in shared memory
+
+    The creating process owns the segments. Keep it open while workers
+    use the `handle`, then call `unlink()` (or use the object as a
+    context manager) to free the memory. Workers only `close()`.
+
+    Args:
+    reader (WDFReader) : The reader of the wdf file
+    """
+
+    def __init__(self, reader):
+        lazy = LazySpectra(reader)
+        arrays = [("spectra", lazy.shape, lazy.dtype)]
+        arrays.append(("xdata", reader.xdata.shape, reader.xdata.dtype))
+        if "ORGN" in reader.block_info:
+            origin_list = reader.origin_list
+            arrays.append(("origin_list", origin_list.shape, origin_list.dtype))
+        specs = {}
+        segments = []
+        try:
+            for name, shape, dtype in arrays:
+                size = int(numpy.prod(shape)) * dtype.itemsize
+                segments.append(_open_segment(size=size))
+                specs[name] = (segments[-1].name, shape, dtype)
+            SharedArrays.__init__(self, SharedHandle(specs), segments=segments)
+            # DATA is read directly into shared memory without a copy
+            reader.read_spectra_into(self.spectra)
+            self.xdata[:] = reader.xdata
+            if "origin_list" in specs:
+                self.origin_list[:] = origin_list
+        except Exception:
+            self.arrays = {}
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+            raise
+
+    def unlink(self):
+        """Close and free the shared memory, attached views become invalid"""
+        segments = self._segments
+        self.close()
+        for segment in segments:
+            segment.unlink()
+
+    def __exit__(self, *args):
+        self.unlink()
@@ -0,0 +1,261 @@
+# Byte sources for reading wdf files with positional I/O
+# Every read is given an absolute position and no file pointer is
+# shared between reads, so one source can serve several threads
+import io
+import os
+import re
+import threading
+import urllib.request
+from collections import OrderedDict
+import numpy
+
+
+class ByteSource(object):
+    """Base class of byte sources used by `WDFReader`
+
+    Subclasses implement `read(pos, size)`. `read_array` by default
+    decodes the result of `read`, subclasses may provide a faster path
+    """
+
+    def read(self, pos, size):
+        """Read at most `size` bytes starting at `pos`"""
+        raise NotImplementedError
+
+    def read_array(self, pos, dtype, count):
+        """Read at most `count` items of `dtype` starting at `pos`"""
+        dtype = numpy.dtype(dtype)
+        data = self.read(pos, dtype.itemsize * count)
+        count = len(data) // dtype.itemsize
+        return numpy.frombuffer(data, dtype=dtype, count=count).copy()
+
+    def read_into(self, pos, out):
+        """Fill the C-contiguous numpy array `out` with bytes from `pos`
+        Returns the number of bytes read
+        """
+        view = memoryview(out.reshape(-1).view("uint8"))
+        data = self.read(pos, len(view))
+        view[: len(data)] = data
+        return len(data)
+
+    def fileno(self):
+        """File descriptor of the source, used for numpy.memmap"""
+        raise io.UnsupportedOperation("Source is not a file on disk")
+
+    def close(self):
+        pass
+
+
+class BufferSource(ByteSource):
+    """In-memory buffer (bytes, memoryview, mmap etc.)
+    The buffer is never copied, arrays are numpy.frombuffer views
+    """
+
+    def __init__(self, buffer):
+        self.buffer = memoryview(buffer).cast("B")
+
+    def read(self, pos, size):
+        return self.buffer[pos : pos + size].tobytes()
+
+    def read_array(self, pos, dtype, count):
+        dtype = numpy.dtype(dtype)
+        count = max(0, min(count, (len(self.buffer) - pos) // dtype.itemsize))
+        if count == 0:
+            return numpy.empty(0, dtype=dtype)
+        return numpy.frombuffer(self.buffer, dtype=dtype, count=count, offset=pos)
+
+    def read_into(self, pos, out):
+        view = memoryview(out.reshape(-1).view("uint8"))
+        data = self.buffer[pos : pos + len(view)]
+        view[: len(data)] = data
+        return len(data)
+
+
+class FileSource(ByteSource):
+    """File on disk, read with os.pread / os.preadv
+    Where positional reads are not available (e.g. Windows), reads
+    fall back to os.lseek + os.read serialized by a lock
+    """
+
+    def __init__(self, file_obj):
+        self.file_obj = file_obj
+        self.fd = file_obj.fileno()
+        self._lock = threading.Lock()
+
+    def __pread(self, size, pos):
+        if hasattr(os, "pread"):
+            return os.pread(self.fd, size, pos)
+        with self._lock:
+            os.lseek(self.fd, pos, os.SEEK_SET)
+            return os.read(self.fd, size)
+
+    def read(self, pos, size):
+        chunks = []
+        while size > 0:
+            data = self.__pread(size, pos)
+            if len(data) == 0:
+                break
+            chunks.append(data)
+            pos += len(data)
+            size -= len(data)
+        return b"".join(chunks)
+
+    def read_array(self, pos, dtype, count):
+        if not hasattr(os, "preadv"):
+            return ByteSource.read_array(self, pos, dtype, count)
+        dtype = numpy.dtype(dtype)
+        array = numpy.empty(count, dtype=dtype)
+        n_read = self.read_into(pos, array)
+        return array[: n_read // dtype.itemsize]
+
+    def read_into(self, pos, out):
+        if not hasattr(os, "preadv"):
+            return ByteSource.read_into(self, pos, out)
+        # Read directly into the array without intermediate bytes
+        view = memoryview(out.reshape(-1).view("uint8"))
+        n_read = 0
+        while n_read < len(view):
+            n = os.preadv(self.fd, [view[n_read:]], pos + n_read)
+            if n == 0:
+                break
+            n_read += n
+        return n_read
+
+    def fileno(self):
+        return self.fd
+
+
+class StreamSource(ByteSource):
+    """Any seekable binary file object, e.g. members of zip or tar archives
+    The file object has a single position, reads are serialized by a lock
+    """
+
+    def __init__(self, file_obj):
+        self.file_obj = file_obj
+        self._lock = threading.Lock()
+
+    def read(self, pos, size):
+        with self._lock:
+            self.file_obj.seek(pos)
+            return self.file_obj.read(size)
+
+
+class HTTPSource(ByteSource):
+    """File on an HTTP(S) server, read with `Range` requests
+
+    Args:
+    url (str) : URL of the wdf file
+    block_size (int) : Size of the cached blocks in bytes
+    cache_blocks (int) : Max number of cached blocks, least recently
+                         used blocks are dropped
+    headers (dict) : Additional request headers, e.g. Authorization
+    timeout (float) : Timeout of each request in seconds
+
+    Small reads (headers, block walk, single spectra) go through the
+    block cache, the missing blocks of a read are fetched with a single
+    request. Reads larger than half of the cache bypass it.
+
+    Attributes:
+    size (int) : Size of the file
+    n_requests (int) : Number of requests sent
+    n_bytes (int) : Number of bytes received
+    """
+
+    _content_range = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+    def __init__(
+        self, url, block_size=64 * 1024, cache_blocks=64, headers=None, timeout=30.0
+    ):
+        self.url = url
+        self.name = url
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.n_requests = 0
+        self.n_bytes = 0
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        # The first block also tells the file size
+        self.size = None
+        first = self.__request(0, block_size - 1)
+        self.__add_block(0, first)
+
+    def __request(self, start, end):
+        """Bytes start to end (inclusive) of the file"""
+        headers = dict(self.headers)
+        headers["Range"] = "bytes={0}-{1}".format(start, end)
+        request = urllib.request.Request(self.url, headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if response.status != 206:
+                raise IOError("Server of {0} ignores range requests!".format(self.url))
+            if self.size is None:
+                match = self._content_range.match(
+                    response.headers.get("Content-Range", "")
+                )
+                if (match is None) or (match.group(3) == "*"):
+                    raise IOError("Unknown size of {0}!".format(self.url))
+                self.size = int(match.group(3))
+            data = response.read()
+        with self._lock:
+            self.n_requests += 1
+            self.n_bytes += len(data)
+        return data
+
+    def __add_block(self, index, data):
+        with self._lock:
+            self._blocks[index] = data
+            self._blocks.move_to_end(index)
+            while len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+
+    def read(self, pos, size):
+        end = min(pos + size, self.size)
+        if end <= pos:
+            return b""
+        bs = self.block_size
+        first, last = pos // bs, (end - 1) // bs
+        if 2 * (last - first + 1) > self.cache_blocks:
+            return self.__request(pos, end - 1)
+        blocks = {}
+        with self._lock:
+            for i in range(first, last + 1):
+                if i in self._blocks:
+                    self._blocks.move_to_end(i)
+                    blocks[i] = self._blocks[i]
+        missing = [i for i in range(first, last + 1) if i not in blocks]
+        if missing:
+            # Coalesce all missing blocks into one request
+            m_first, m_last = missing[0], missing[-1]
+            data = self.__request(m_first * bs, min((m_last + 1) * bs, self.size) - 1)
+            for i in range(m_first, m_last + 1):
+                blocks[i] = data[(i - m_first) * bs : (i - m_first + 1) * bs]
+                self.__add_block(i, blocks[i])
+        data = b"".join(blocks[i] for i in range(first, last + 1))
+        return data[pos - first * bs : end - first * bs]
+
+    def close(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+def open_source(file_obj):
+    """Choose the byte source for a buffer or an opened binary file object"""
+    if isinstance(file_obj, ByteSource):
+        return file_obj
+    if isinstance(file_obj, io.BytesIO):
+        # View the content of BytesIO without copy
+        return BufferSource(file_obj.getbuffer())
+    try:
+        # bytes, bytearray, memoryview, mmap etc.
+        return BufferSource(file_obj)
+    except TypeError:
+        pass
+    # Only raw OS files, compressed files (gzip, bz2, lzma) also have
+    # fileno() but it points at the compressed bytes
+    if isinstance(file_obj, (io.BufferedReader, io.BufferedRandom)):
+        raw = file_obj.raw
+    else:
+        raw = file_obj
+    if isinstance(raw, io.FileIO):
+        return FileSource(file_obj)
+    return StreamSource(file_obj)
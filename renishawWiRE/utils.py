@@ -1,4 +1,5 @@
 # Some tiny functions for converting things
+from enum import Enum
 from numpy import nan
 
 
@@ -14,3 +15,12 @@ def convert_wl(wn):
 def convert_attr_name(s):
     """Convert all underline in string name to space and capitalize"""
     return " ".join(map(str.capitalize, s.strip().split("_")))
+
+
+def json_value(value):
+    """Convert enums and numpy scalars for json"""
+    if isinstance(value, Enum):
+        return value.name
+    if hasattr(value, "item"):
+        return value.item()
+    return value
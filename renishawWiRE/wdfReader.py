@@ -4,10 +4,18 @@ from __future__ import print_function
 import struct
 import numpy
 import io
-from .types import LenType, DataType, MeasurementType
-from .types import ScanType, UnitType, DataType
+import os
+import json
+import time
+import threading
+from .types import LenType, DataType, UnitType
 from .types import Offsets, ExifTags
-from .utils import convert_wl, convert_attr_name
+from .utils import convert_attr_name
+from .header import decode_header
+from .source import open_source, FileSource, HTTPSource
+from .lazy import LazySpectra, to_dask
+from .shared import SharedSpectra
+from .cache import ParseCache
 from sys import stderr
 
 try:
@@ -43,8 +51,28 @@ class WDFReader(object):
     Block uid: int32
     Block size: int64
 
+    Only the WDF1 header is parsed when the reader is created. Attributes
+    from other blocks (`spectra`, `xdata`, `xpos`, `map_info`, `img` etc.)
+    are parsed on first access and cached afterwards.
+
+    All reads use positional I/O (os.pread for files on disk), and lazy
+    parsing is guarded by a lock. One reader can therefore be shared by
+    several threads calling e.g. `read_spectra` or `iter_spectra`
+    concurrently. `refresh` should not run concurrently with other reads.
+
     Args:
-    file_name (file) : File object for the wdf file
+    file_name (file) : Path of the wdf file, a seekable binary file object,
+                       a buffer (bytes, memoryview, mmap) with the file content,
+                       an http(s) URL or a `ByteSource` (see source.py)
+    mmap (bool) : If True, `spectra` is a read-only numpy.memmap view of the
+                  DATA block instead of an in-memory copy
+    block_index (bool) : If True, load the block table from a `.wdfidx`
+                         sidecar file next to the wdf file, or create it.
+                         The sidecar is validated by file size and mtime
+    cache (ParseCache or bool) : If given, parsed blocks of completed
+                                 measurements are loaded from / stored into
+                                 the on-disk cache, see cache.py.
+                                 True uses the default cache directory
 
     Attributes:
     title (str) : Title of measurement
@@ -72,13 +100,34 @@ class WDFReader(object):
     block_info (dict) : Info block at least with following keys
                         DATA, XLST, YLST, ORGN
                         # TODO types?
+                        If a block name appears several times,
+                        the last block is kept
+    block_table (list) : All blocks in file order, each entry is
+                         (name, uid, offset, size)
     """
 
-    def __init__(self, file_name, debug=False):
-        try:
-            self.file_obj = open(str(file_name), "rb")
-        except IOError:
-            raise IOError("File {0} does noe exist!".format(file_name))
+    def __init__(
+        self, file_name, debug=False, mmap=False, block_index=False, cache=None
+    ):
+        # Only close the file object when it is opened by the reader
+        self._own_file = False
+        if isinstance(file_name, str) and file_name.startswith(
+            ("http://", "https://")
+        ):
+            # Only the needed byte ranges are downloaded
+            self.file_obj = HTTPSource(file_name)
+            self._own_file = True
+        elif isinstance(file_name, (str, os.PathLike)):
+            try:
+                self.file_obj = open(str(file_name), "rb")
+            except IOError:
+                raise IOError("File {0} does noe exist!".format(file_name))
+            self._own_file = True
+        else:
+            # Buffer or binary file object
+            self.file_obj = file_name
+        # All reads go through the byte source, see source.py
+        self._source = open_source(self.file_obj)
         # Initialize the properties for the wdfReader class
         self.title = ""
         self.username = ""
@@ -87,10 +136,6 @@ class WDFReader(object):
         self.laser_length = None
         self.count = None
         self.spectral_unit = None
-        self.xlist_type = None
-        self.xlist_unit = None
-        self.ylist_type = None
-        self.ylist_unit = None
         self.point_per_spectrum = None
         self.data_origin_count = None
         self.capacity = None
@@ -100,22 +145,40 @@ class WDFReader(object):
         self.ylist_length = 0
         self.accumulation_count = None
         self.block_info = {}  # each key has value (uid, offset, size)
+        self.block_table = []  # each entry is (name, uid, offset, size)
         self.is_completed = False
         self.debug = debug
+        self.mmap = mmap
+        self._parsed_blocks = set()
+        self._lock = threading.RLock()
+        # Buffers with `capacity` spectra, used by refresh()
+        self._spectra_buffer = None
+        self._origin_buffers = None
+        # Decoded white-light image, see get_img()
+        self._img_decoded = None
         # Parse the header section in the wdf file
-        self.__locate_all_blocks()
-        # Parse individual blocks
+        # Sidecar block index is only possible for wdf files on disk
+        block_index = (
+            block_index and self._own_file and isinstance(self._source, FileSource)
+        )
+        if not (block_index and self.__load_block_index(file_name)):
+            self.__locate_all_blocks()
+            if block_index:
+                self.__save_block_index(file_name)
+        for block_name, block_uid, block_pos, block_size in self.block_table:
+            self.block_info[block_name] = (block_uid, block_pos, block_size)
+        # Only the header is parsed here, other blocks are parsed
+        # on first access of their attributes (see __getattr__)
+        if "WDF1" not in self.block_info:
+            raise ValueError("The wdf file format is incorrect!")
         self.__treat_block_data("WDF1")
-        self.__treat_block_data("DATA")
-        self.__treat_block_data("XLST")
-        self.__treat_block_data("YLST")
-        self.__treat_block_data("ORGN")
-        self.__treat_block_data("WMAP")
-        self.__treat_block_data("WHTL")
-
-        # Reshape spectra after reading mapping information
-        self.__reshape_spectra()
-        # self._parse_wmap()
+        # Key of the on-disk cache, only for completed files on disk
+        self._cache = ParseCache() if cache is True else (cache or None)
+        self._cache_key = None
+        if (self._cache is not None) and self.is_completed:
+            self._cache_key = self._cache.key(
+                self.file_obj, self._source.read(0, Offsets.data_block)
+            )
 
         # Finally print the information
         if self.debug:
@@ -123,10 +186,99 @@ class WDFReader(object):
             self.print_info(file=stderr)
             print("=" * 80, file=stderr)
 
+    # Attributes parsed lazily from each block
+    _lazy_attrs = {
+        "DATA": ("spectra",),
+        "XLST": ("xlist_type", "xlist_unit", "xdata"),
+        "YLST": ("ylist_type", "ylist_unit", "ydata"),
+        "ORGN": (
+            "origin_list_header",
+            "origin_list",
+            "xpos",
+            "ypos",
+            "zpos",
+            "xpos_unit",
+            "ypos_unit",
+            "zpos_unit",
+            "start_time",
+        ),
+        "WMAP": ("map_shape", "map_info"),
+        "WHTL": (
+            "img",
+            "img_dimensions",
+            "img_origins",
+            "img_dimension_unit",
+            "img_cropbox",
+        ),
+    }
+    _lazy_blocks = {
+        attr: block_name
+        for block_name, attrs in _lazy_attrs.items()
+        for attr in attrs
+    }
+    # Attributes that are None if their block is not in the file
+    _optional_attrs = ("xlist_type", "xlist_unit", "ylist_type", "ylist_unit")
+    # Attributes stored in the on-disk cache. DATA is not cached, it is
+    # read with one bulk read (or memory-mapped) anyway, as is the image.
+    # The ORGN columns are stored once in `origin_list`, see
+    # `__store_cached_block`
+    _cached_attrs = dict(
+        XLST=_lazy_attrs["XLST"],
+        YLST=_lazy_attrs["YLST"],
+        ORGN=(
+            "origin_list_header",
+            "origin_list",
+            "xpos_unit",
+            "ypos_unit",
+            "zpos_unit",
+            "start_time",
+        ),
+        WMAP=_lazy_attrs["WMAP"],
+        WHTL=(
+            "img_dimensions",
+            "img_origins",
+            "img_dimension_unit",
+            "img_cropbox",
+            "_img_size",
+        ),
+    )
+
+    def __getattr__(self, name):
+        """Parse the block containing attribute `name` on first access.
+        Parsed attributes are stored on the instance, so that later
+        access does not go through this method again.
+        """
+        block_name = WDFReader._lazy_blocks.get(name, None)
+        parsed = self.__dict__.get("_parsed_blocks", None)
+        if (block_name is None) or (parsed is None):
+            raise AttributeError(
+                "{0} object has no attribute {1}".format(type(self).__name__, name)
+            )
+        with self._lock:
+            # Another thread may have parsed the block meanwhile
+            if block_name not in parsed:
+                parsed.add(block_name)
+                try:
+                    self.__treat_block_data(block_name)
+                except Exception:
+                    parsed.discard(block_name)
+                    raise
+        try:
+            return object.__getattribute__(self, name)
+        except AttributeError:
+            if name in WDFReader._optional_attrs:
+                return None
+            raise
+
     def close(self):
-        self.file_obj.close()
-        if hasattr(self, "img"):
+        if self._own_file:
+            self.file_obj.close()
+        # Do not trigger parsing of WHTL when closing
+        if "img" in self.__dict__:
             self.img.close()
+        if self._img_decoded is not None:
+            self._img_decoded.close()
+            self._img_decoded = None
 
     def __get_type_string(self, attr, data_type):
         """Get the enumerated-data_type as string"""
@@ -136,8 +288,8 @@ class WDFReader(object):
         else:
             return data_type(val).name
 
-    def __read_type(self, type, size=1):
-        """Unpack struct data for certain type"""
+    def __read_type(self, type, pos, size=1):
+        """Unpack struct data for certain type at position pos"""
         if type in ["int16", "int32", "int64", "float", "double"]:
             if size > 1:
                 raise NotImplementedError(
@@ -146,35 +298,71 @@ class WDFReader(object):
             # unpack into unsigned values
             fmt_out = LenType["s_" + type].value
             fmt_in = LenType["l_" + type].value
-            return struct.unpack(fmt_out, self.file_obj.read(fmt_in * size))[0]
+            return struct.unpack(fmt_out, self._source.read(pos, fmt_in * size))[0]
         elif type == "utf8":
             # Read utf8 string with determined size block
-            return self.file_obj.read(size).decode("utf8").replace("\x00", "")
+            return self._source.read(pos, size).decode("utf8").replace("\x00", "")
         else:
             raise ValueError("Unknown data length format!")
 
     def __locate_single_block(self, pos):
         """Get block information starting at pos"""
-        self.file_obj.seek(pos)
-        block_name = self.file_obj.read(0x4).decode("ascii")
-        if len(block_name) < 4:
+        # Block name, uid and size are read in one go
+        head = self._source.read(pos, Offsets.block_data)
+        if len(head) < Offsets.block_data:
             raise EOFError
-        block_uid = self.__read_type("int32")
-        block_size = self.__read_type("int64")
-        return block_name, block_uid, block_size
+        block_name, block_uid, block_size = struct.unpack("<4sIQ", head)
+        return block_name.decode("ascii"), block_uid, block_size
 
     def __locate_all_blocks(self):
-        """Get information for all data blocks and store them inside self.block_info"""
+        """Get information for all data blocks and store them inside self.block_table"""
         curpos = 0
         finished = False
         while not finished:
             try:
                 block_name, block_uid, block_size = self.__locate_single_block(curpos)
-                self.block_info[block_name] = (block_uid, curpos, block_size)
+                self.block_table.append((block_name, block_uid, curpos, block_size))
+                if block_size == 0:
+                    raise EOFError
                 curpos += block_size
             except (EOFError, UnicodeDecodeError):
                 finished = True
 
+    def __file_stat(self):
+        """Size and mtime (ns) of the opened file, to validate the sidecar"""
+        stat = os.fstat(self.file_obj.fileno())
+        return stat.st_size, stat.st_mtime_ns
+
+    def __load_block_index(self, file_name):
+        """Load self.block_table from the `.wdfidx` sidecar file
+        Return True if the sidecar exists and matches the wdf file
+        """
+        index_name = str(file_name) + ".wdfidx"
+        try:
+            with open(index_name, "r") as f:
+                index = json.load(f)
+        except (IOError, ValueError):
+            return False
+        size, mtime = self.__file_stat()
+        if (index.get("size") != size) or (index.get("mtime_ns") != mtime):
+            if self.debug:
+                print("Block index {0} is outdated".format(index_name), file=stderr)
+            return False
+        self.block_table = [tuple(entry) for entry in index.get("blocks", [])]
+        return len(self.block_table) > 0
+
+    def __save_block_index(self, file_name):
+        """Write self.block_table into the `.wdfidx` sidecar file"""
+        index_name = str(file_name) + ".wdfidx"
+        size, mtime = self.__file_stat()
+        index = dict(size=size, mtime_ns=mtime, blocks=self.block_table)
+        try:
+            with open(index_name, "w") as f:
+                json.dump(index, f)
+        except IOError:
+            if self.debug:
+                print("Cannot write block index {0}".format(index_name), file=stderr)
+
     def __treat_block_data(self, block_name):
         """Get data according to specific block name"""
         if block_name not in self.block_info.keys():
@@ -197,50 +385,68 @@ class WDFReader(object):
             "WHTL": ("_parse_img", ()),
         }
         func_name, val = actions[block_name]
+        cached = (self.__dict__.get("_cache_key", None) is not None) and (
+            block_name in self._cached_attrs
+        )
+        if cached and self.__load_cached_block(block_name):
+            return
         getattr(self, func_name)(*val)
+        if cached:
+            self.__store_cached_block(block_name)
+
+    def __load_cached_block(self, block_name):
+        """Set the attributes of a block from the cache
+        Return True if the block is in the cache
+        """
+        values = self._cache.load(
+            self._cache_key, block_name, mmap_mode="r" if self.mmap else "c"
+        )
+        if values is None:
+            return False
+        for attr, value in values.items():
+            setattr(self, attr, value)
+        if block_name == "ORGN":
+            # Columns of the header are views of `origin_list`
+            self.xpos = numpy.zeros(self.count)
+            self.ypos = numpy.zeros(self.count)
+            self.zpos = numpy.zeros(self.count)
+            for header, name in zip(
+                self.origin_list_header, self.origin_list.dtype.names
+            ):
+                header[4] = self.origin_list[name]
+                if header[1] == DataType.Spatial_X:
+                    self.xpos = header[4]
+                elif header[1] == DataType.Spatial_Y:
+                    self.ypos = header[4]
+                elif header[1] == DataType.Spatial_Z:
+                    self.zpos = header[4]
+        if block_name == "WHTL":
+            self.img = self.__read_img()
+        return True
+
+    def __store_cached_block(self, block_name):
+        """Store the parsed attributes of a block in the cache"""
+        values = {
+            attr: self.__dict__[attr]
+            for attr in self._cached_attrs[block_name]
+            if attr in self.__dict__
+        }
+        if block_name == "ORGN":
+            # The column arrays are already in `origin_list`
+            values["origin_list_header"] = [
+                header[:4] + [None] for header in self.origin_list_header
+            ]
+        if len(values) > 0:
+            self._cache.store(self._cache_key, block_name, values)
 
     # The method for reading the info in the file header
 
     def _parse_header(self):
         """Solve block WDF1"""
-        self.file_obj.seek(0)  # return to the head
-        # Must make the conversion under python3
-        block_ID = self.file_obj.read(Offsets.block_id).decode("ascii")
-        block_UID = self.__read_type("int32")
-        block_len = self.__read_type("int64")
-        # First block must be "WDF1"
-        if (
-            (block_ID != "WDF1")
-            or (block_UID != 0 and block_UID != 1)
-            or (block_len != Offsets.data_block)
-        ):
-            raise ValueError("The wdf file format is incorrect!")
-        # TODO what are the digits in between?
-
-        # The keys from the header
-        self.file_obj.seek(Offsets.measurement_info)  # space
-        self.point_per_spectrum = self.__read_type("int32")
-        self.capacity = self.__read_type("int64")
-        self.count = self.__read_type("int64")
-        # If count < capacity, this measurement is not completed
-        self.is_completed = self.count == self.capacity
-        self.accumulation_count = self.__read_type("int32")
-        self.ylist_length = self.__read_type("int32")
-        self.xlist_length = self.__read_type("int32")
-        self.data_origin_count = self.__read_type("int32")
-        self.application_name = self.__read_type("utf8", 24)  # Must be "WiRE"
-        for i in range(4):
-            self.application_version[i] = self.__read_type("int16")
-        self.scan_type = ScanType(self.__read_type("int32"))
-        self.measurement_type = MeasurementType(self.__read_type("int32"))
-        # For the units
-        self.file_obj.seek(Offsets.spectral_info)
-        self.spectral_unit = UnitType(self.__read_type("int32"))
-        self.laser_length = convert_wl(self.__read_type("float"))  # in nm
-        # Username and title
-        self.file_obj.seek(Offsets.file_info)
-        self.username = self.__read_type("utf8", Offsets.usr_name - Offsets.file_info)
-        self.title = self.__read_type("utf8", Offsets.data_block - Offsets.usr_name)
+        # The whole header is decoded with one read, see header.py
+        header = decode_header(self._source.read(0, Offsets.data_block))
+        for key, value in header.items():
+            setattr(self, key, value)
 
     def _parse_xylist(self, dir):
         """Get information from XLST or YLST blocks"""
@@ -249,28 +455,34 @@ class WDFReader(object):
         name = dir.upper() + "LST"
         uid, pos, size = self.block_info[name]
         offset = Offsets.block_data
-        self.file_obj.seek(pos + offset)
         setattr(
             self,
             "{0}list_type".format(dir.lower()),
-            DataType(self.__read_type("int32")),
+            DataType(self.__read_type("int32", pos + offset)),
         )
         setattr(
             self,
             "{0}list_unit".format(dir.lower()),
-            UnitType(self.__read_type("int32")),
+            UnitType(self.__read_type("int32", pos + offset + 0x4)),
         )
         size = getattr(self, "{0}list_length".format(dir.lower()))
         if size == 0:  # Possibly not started
             raise ValueError("{0}-List possibly not initialized!".format(dir.upper()))
 
-        # self.file_obj.seek(pos + offset)
-        data = numpy.fromfile(self.file_obj, dtype="float32", count=size)
+        data = self._source.read_array(pos + offset + 0x8, "float32", size)
         setattr(self, "{0}data".format(dir.lower()), data)
         return
 
     def _parse_spectra(self, start=0, end=-1):
-        """Get information from DATA block"""
+        """Get information from DATA block
+        When all spectra are read, they are reshaped after reading
+        mapping information, otherwise `spectra` is a 1D array
+        """
+        reshape = (start == 0) and (end == -1)
+        if reshape and self.count == 0:
+            # Measurement not started yet, there is no spectrum to read
+            self.spectra = numpy.zeros((0, self.point_per_spectrum), dtype="float32")
+            return
         if end == -1:  # take all spectra
             end = self.count - 1
         if (start not in range(self.count)) or (end not in range(self.count)):
@@ -278,6 +490,15 @@ class WDFReader(object):
         if start > end:
             raise ValueError("Start cannot be larger than end!")
 
+        # The spectra is only 1D array
+        spectra = self.__read_spectra_block(start, end - start + 1)
+        if reshape:
+            spectra = self.__reshape_spectra(spectra)
+        self.spectra = spectra
+        return
+
+    def __read_spectra_block(self, start, n_row):
+        """Read n_row contiguous spectra from DATA block as 1D array"""
         # Determine start position
         uid, pos, size = self.block_info["DATA"]
         pos_start = (
@@ -285,72 +506,341 @@ class WDFReader(object):
             + Offsets.block_data
             + LenType["l_float"].value * start * self.point_per_spectrum
         )
-        n_row = end - start + 1
-        self.file_obj.seek(pos_start)
-        spectra_data = numpy.fromfile(
-            self.file_obj, dtype="float32", count=n_row * self.point_per_spectrum
+        try:
+            fileno = self._source.fileno()
+        except io.UnsupportedOperation:
+            fileno = None
+        if self.mmap and (fileno is not None):
+            # Zero-copy view, pages are only loaded when indexed
+            spectra_data = numpy.memmap(
+                self.file_obj,
+                dtype="float32",
+                mode="r",
+                offset=pos_start,
+                shape=(n_row * self.point_per_spectrum,),
+            )
+        else:
+            # Buffers are already viewed without copy
+            spectra_data = self._source.read_array(
+                pos_start, "float32", n_row * self.point_per_spectrum
+            )
+        return spectra_data
+
+    def read_spectra_into(self, out, start=0):
+        """Read consecutive spectra from the DATA block directly into `out`
+
+        Args:
+        out (numpy.array) : C-contiguous float32 array, its size must be a
+                            multiple of point_per_spectrum
+        start (int) : Index of the first spectrum to read
+
+        Returns the number of spectra read
+        """
+        pps = self.point_per_spectrum
+        if (out.dtype != numpy.float32) or (not out.flags.c_contiguous):
+            raise ValueError("out must be a C-contiguous float32 array!")
+        n_row = min(out.size // pps, max(0, self.count - start))
+        uid, pos, size = self.block_info["DATA"]
+        pos_start = pos + Offsets.block_data + LenType["l_float"].value * start * pps
+        n_read = self._source.read_into(pos_start, out.reshape(-1)[: n_row * pps])
+        return n_read // (LenType["l_float"].value * pps)
+
+    def __read_spectra_indices(self, indices):
+        """Read spectra at flat `indices` into a (n, point_per_spectrum) array
+        Indices are sorted and neighbouring ones are read in one block
+        """
+        indices = numpy.asarray(indices, dtype="int64").ravel()
+        indices = numpy.where(indices < 0, indices + self.count, indices)
+        if numpy.any((indices < 0) | (indices >= self.count)):
+            raise IndexError("Spectrum index out of range of {0}!".format(self.count))
+        pps = self.point_per_spectrum
+        # Spectra already loaded in memory, no need to read again
+        if (not self.mmap) and ("spectra" in self.__dict__):
+            return numpy.reshape(self.spectra, (-1, pps))[indices]
+
+        unique, inverse = numpy.unique(indices, return_inverse=True)
+        data = numpy.empty((len(unique), pps), dtype="float32")
+        if len(unique) == 0:
+            return data
+        # Split the sorted indices into runs of consecutive spectra
+        starts = numpy.concatenate(([0], numpy.nonzero(numpy.diff(unique) > 1)[0] + 1))
+        ends = numpy.concatenate((starts[1:], [len(unique)]))
+        for i_start, i_end in zip(starts, ends):
+            block = self.__read_spectra_block(int(unique[i_start]), i_end - i_start)
+            data[i_start:i_end] = numpy.reshape(block, (i_end - i_start, pps))
+        if numpy.array_equal(unique, indices):
+            return data
+        return data[inverse.ravel()]
+
+    def read_spectra(self, selection):
+        """Read only the selected spectra from the DATA block
+
+        Args:
+        selection : One of
+                    int: index of a single spectrum, returns 1D array
+                    slice or list of int: indices of spectra,
+                    returns array of shape (n, point_per_spectrum)
+                    tuple (row, col): window on the mapping grid of
+                    `map_shape`, row and col can be int, slice or list.
+                    Lists select all their combinations like `numpy.ix_`,
+                    e.g. (rows, cols) gives len(rows) * len(cols) spectra
+                    of shape (len(rows), len(cols), point_per_spectrum),
+                    not the pairs (rows[i], cols[i]) of numpy indexing
+
+        Neighbouring spectra are coalesced into as few reads as possible
+        """
+        if isinstance(selection, tuple):
+            if len(selection) != 2:
+                raise IndexError("Mapping selection must be (row, col)!")
+            spectra_w, spectra_h = self.map_shape
+            rows = numpy.asarray(numpy.arange(spectra_h)[selection[0]])
+            cols = numpy.asarray(numpy.arange(spectra_w)[selection[1]])
+            # Flat index of the spectra, in row-first order
+            flat = numpy.reshape(rows, rows.shape + (1,) * cols.ndim) * spectra_w + cols
+            data = self.__read_spectra_indices(flat)
+            return numpy.reshape(data, flat.shape + (self.point_per_spectrum,))
+        if isinstance(selection, slice):
+            indices = numpy.arange(self.count)[selection]
+        else:
+            indices = numpy.asarray(selection)
+        data = self.__read_spectra_indices(indices)
+        if indices.ndim == 0:
+            return data[0]
+        return data
+
+    def iter_spectra(self, chunk_size=1024, as_grid_rows=False, start=0):
+        """Iterate over the spectra in chunks with bounded memory
+        The DATA block is read sequentially, at most `chunk_size` spectra
+        (chunk_size * point_per_spectrum * 4 bytes) are held at a time.
+
+        Args:
+        chunk_size (int) : Max number of spectra in each chunk
+        as_grid_rows (bool) : If True, yield whole rows of the mapping
+                              grid in `map_shape`, at least one row per chunk.
+                              Incomplete rows at the end are not yielded
+        start (int) : Index of the first spectrum. With `as_grid_rows`,
+                      iteration starts at the row containing it
+
+        Yields (indices, spectra, positions):
+        indices (numpy.array) : Flat indices of the spectra in the chunk
+        spectra (numpy.array) : Shape (n, point_per_spectrum), or
+                                (n_rows, spectra_w, point_per_spectrum)
+                                when `as_grid_rows` is True
+        positions (numpy.array) : Slice of `origin_list` for the chunk,
+                                  None if the file has no ORGN block
+        """
+        pps = self.point_per_spectrum
+        if as_grid_rows:
+            spectra_w, spectra_h = self.map_shape
+            step = max(1, chunk_size // spectra_w) * spectra_w
+            n_total = min(self.count, spectra_w * spectra_h)
+            n_total -= n_total % spectra_w
+            start -= start % spectra_w
+            shape = (-1, spectra_w)
+        else:
+            step = max(1, chunk_size)
+            n_total = self.count
+            shape = (-1,)
+        origin_list = self.origin_list if "ORGN" in self.block_info else None
+        for first in range(start, n_total, step):
+            n_row = min(step, n_total - first)
+            indices = numpy.arange(first, first + n_row)
+            spectra = self.__read_spectra_block(first, n_row)
+            positions = None
+            if origin_list is not None:
+                positions = numpy.reshape(origin_list[first : first + n_row], shape)
+            yield (
+                numpy.reshape(indices, shape),
+                numpy.reshape(spectra, shape + (pps,)),
+                positions,
+            )
+
+    def refresh(self):
+        """Check for new spectra of an in-progress measurement
+        The header is read again to get the current `count`. Spectra and
+        origin entries appended since the last call are read into buffers
+        preallocated with `capacity` spectra, all previously read data
+        are kept in place. Blocks not parsed yet are not touched.
+
+        Returns the number of new spectra
+        """
+        old_count = self.count
+        header = decode_header(self._source.read(0, Offsets.data_block))
+        if header["count"] <= old_count:
+            return 0
+        for key, value in header.items():
+            setattr(self, key, value)
+
+        if "origin_list_header" in self.__dict__:
+            self.__refresh_origin_list(old_count)
+        if "spectra" in self.__dict__:
+            if self.mmap:
+                # Only need a larger view
+                self._parse_spectra()
+            else:
+                pps = self.point_per_spectrum
+                if self._spectra_buffer is None:
+                    self._spectra_buffer = numpy.empty(
+                        (self.capacity, pps), dtype="float32"
+                    )
+                    self._spectra_buffer[:old_count] = numpy.reshape(
+                        self.spectra, (old_count, pps)
+                    )
+                new_data = self.__read_spectra_block(old_count, self.count - old_count)
+                self._spectra_buffer[old_count : self.count] = numpy.reshape(
+                    new_data, (-1, pps)
+                )
+                # Flat view as from _parse_spectra
+                spectra = numpy.reshape(self._spectra_buffer[: self.count], -1)
+                self.spectra = self.__reshape_spectra(spectra)
+        if "img_cropbox" in self.__dict__:
+            # Mapped area may become larger
+            self.img_cropbox = self.__calc_crop_box()
+        return self.count - old_count
+
+    def __refresh_origin_list(self, old_count):
+        """Read origin entries from old_count to self.count, see refresh()"""
+        uid, pos, size = self.block_info["ORGN"]
+        list_increment = (
+            Offsets.origin_increment + LenType.l_double.value * self.capacity
         )
-        # if len(spectra_data.shape) > 1:
-        # The spectra is only 1D array
-        # spectra_data = spectra_data.reshape(
-        # n_row, spectra_data.size // n_row)
-        self.spectra = spectra_data
-        return
+        if self._origin_buffers is None:
+            self._origin_buffers = []
+            for header in self.origin_list_header:
+                buffer = numpy.zeros(self.capacity)
+                buffer[:old_count] = header[4]
+                self._origin_buffers.append(buffer)
+            self._origin_list_buffer = numpy.zeros(
+                self.capacity, dtype=self.origin_list.dtype
+            )
+            self._origin_list_buffer[:old_count] = self.origin_list
+        # All possible to have x y and z positions!
+        self.xpos = numpy.zeros(self.count)
+        self.ypos = numpy.zeros(self.count)
+        self.zpos = numpy.zeros(self.count)
+        n_new = self.count - old_count
+        for i, header in enumerate(self.origin_list_header):
+            # Start of the data in the i-th list
+            curpos = pos + Offsets.origin_info + i * list_increment
+            curpos += Offsets.origin_increment
+            if header[1] == DataType.Time:
+                # Time relative to the first spectrum, see _parse_orgin_list
+                t0 = self._source.read_array(curpos, "<i8", 1)[0] / 1e7
+                self.start_time = float(t0)
+                array = self._source.read_array(
+                    curpos + LenType.l_int64.value * old_count, "<i8", n_new
+                )
+                array = array / 1e7 - t0
+            else:
+                array = self._source.read_array(
+                    curpos + LenType.l_double.value * old_count, "<f8", n_new
+                )
+            buffer = self._origin_buffers[i]
+            buffer[old_count : self.count] = array
+            self._origin_list_buffer[self.origin_list.dtype.names[i]][
+                old_count : self.count
+            ] = array
+            header[4] = buffer[: self.count]
+            if header[1] == DataType.Spatial_X:
+                self.xpos = header[4]
+            elif header[1] == DataType.Spatial_Y:
+                self.ypos = header[4]
+            elif header[1] == DataType.Spatial_Z:
+                self.zpos = header[4]
+        self.origin_list = self._origin_list_buffer[: self.count]
+
+    def follow(self, interval=1.0, timeout=None):
+        """Follow an in-progress measurement, calling refresh() periodically
+
+        Args:
+        interval (float) : Seconds between two checks
+        timeout (float) : Stop after so many seconds without new spectra,
+                          None to wait until the measurement is completed
+
+        Yields the number of new spectra each time new data arrive
+        """
+        last_update = time.time()
+        while not self.is_completed:
+            n_new = self.refresh()
+            if n_new > 0:
+                last_update = time.time()
+                yield n_new
+            elif (timeout is not None) and (time.time() - last_update > timeout):
+                return
+            else:
+                time.sleep(interval)
+
+    def lazy_spectra(self):
+        """Array-like view of the spectra that reads only on indexing
+        See `LazySpectra` in lazy.py
+        """
+        return LazySpectra(self)
+
+    def to_dask(self, chunk_size=4096):
+        """Spectra as a chunked dask array, without reading the DATA block
+
+        Args:
+        chunk_size (int) : Max number of spectra in each chunk. For a 2D
+                           mapping, chunks are whole rows of the grid
+                           (at least one row per chunk)
+
+        Each chunk holds all points of its spectra, so it is a contiguous
+        byte range of the DATA block. Requires dask; chunks are read in
+        parallel by dask's threaded scheduler.
+        """
+        return to_dask(self, chunk_size=chunk_size)
+
+    def to_shared_memory(self):
+        """Load spectra, xdata and ORGN arrays into shared memory
+        Returns a `SharedSpectra` (see shared.py), pass its `handle`
+        to worker processes and call `unlink()` when they are done
+        """
+        return SharedSpectra(self)
 
     def _parse_orgin_list(self):
         """Get information from OriginList
         Set the following attributes:
         `self.origin_list_header`: 2D-array
-        `self.origin_list`: origin list
+        `self.origin_list`: origin list as a structured array,
+                            one field per origin column
+        `self.start_time`: Time of the first spectrum in seconds (FileTime),
+                           None if there is no time column
         """
         # First confirm origin list type
         uid, pos, size = self.block_info["ORGN"]
-        self.origin_list_header = [
-            [
-                None,
-            ]
-            * 5
-            for i in range(self.data_origin_count)
-        ]
+        # The data of each column is appended to its header below
+        self.origin_list_header = [list(h) + [None] for h in self.read_origin_header()]
         # All possible to have x y and z positions!
         self.xpos = numpy.zeros(self.count)
         self.ypos = numpy.zeros(self.count)
         self.zpos = numpy.zeros(self.count)
+        self.start_time = None
         list_increment = (
             Offsets.origin_increment + LenType.l_double.value * self.capacity
         )
         curpos = pos + Offsets.origin_info
 
         for i in range(self.data_origin_count):
-            self.file_obj.seek(curpos)
-            p1 = self.__read_type("int32")
-            p2 = self.__read_type("int32")
-            s = self.__read_type("utf8", 0x10)
-            # First index: is the list x, or y pos?
-            self.origin_list_header[i][0] = (p1 >> 31 & 0b1) == 1
-            # Second: Data type of the row
-            self.origin_list_header[i][1] = DataType(p1 & ~(0b1 << 31))
-            # Third: Unit
-            self.origin_list_header[i][2] = UnitType(p2)
-            # Fourth: annotation
-            self.origin_list_header[i][3] = s
             # Last: the actual data
-            # array = numpy.empty(self.count)
-
             # Time appears to be recorded as int64 in 100 nanosecond intervals
             # Possibly using the .NET DateTime epoch
             # Reference does not appear to be  Unix Epoch time
             # Set time[0] = 0 until timestamp reference can be determined
             # Resulting array will have unit of `FileTime` in seconds
+            # Each column is decoded with a single bulk read
             if self.origin_list_header[i][1] == DataType.Time:
                 array = (
-                    numpy.array([self.__read_type("int64") for i in range(self.count)])
+                    self._source.read_array(
+                        curpos + Offsets.origin_increment, "<i8", self.count
+                    )
                     / 1e7
                 )
-                array = array - array[0]
+                if self.count > 0:
+                    self.start_time = float(array[0])
+                    array = array - array[0]
             else:
-                array = numpy.array(
-                    [self.__read_type("double") for i in range(self.count)]
+                array = self._source.read_array(
+                    curpos + Offsets.origin_increment, "<f8", self.count
                 )
 
             self.origin_list_header[i][4] = array
@@ -368,6 +858,52 @@ class WDFReader(object):
                 pass
             curpos += list_increment
 
+        # Combine all columns into one structured array, named by data type
+        names = []
+        for header in self.origin_list_header:
+            name = header[1].name
+            if name in names:
+                name = "{0}_{1}".format(name, len(names))
+            names.append(name)
+        self.origin_list = numpy.empty(
+            self.count, dtype=[(name, "float64") for name in names]
+        )
+        for name, header in zip(names, self.origin_list_header):
+            self.origin_list[name] = header[4]
+
+    def read_origin_header(self):
+        """Read the header of each ORGN column without the column data
+
+        Return a list of (is_key, data_type, unit, annotation) tuples, one per
+        column as in `origin_list_header`. Empty if there is no ORGN block
+        """
+        if "ORGN" not in self.block_info:
+            return []
+        uid, pos, size = self.block_info["ORGN"]
+        list_increment = (
+            Offsets.origin_increment + LenType.l_double.value * self.capacity
+        )
+        curpos = pos + Offsets.origin_info
+        header = []
+        for i in range(self.data_origin_count):
+            p1 = self.__read_type("int32", curpos)
+            p2 = self.__read_type("int32", curpos + 0x4)
+            s = self.__read_type("utf8", curpos + 0x8, 0x10)
+            header.append(
+                (
+                    # First index: is the list x, or y pos?
+                    (p1 >> 31 & 0b1) == 1,
+                    # Second: Data type of the row
+                    DataType(p1 & ~(0b1 << 31)),
+                    # Third: Unit
+                    UnitType(p2),
+                    # Fourth: annotation
+                    s,
+                )
+            )
+            curpos += list_increment
+        return header
+
     def _parse_wmap(self):
         """Get information about mapping in StreamLine and StreamLineHR"""
         try:
@@ -380,36 +916,37 @@ class WDFReader(object):
                 )
             return
 
-        self.file_obj.seek(pos + Offsets.wmap_origin)
-        x_start = self.__read_type("float")
-        if not numpy.isclose(x_start, self.xpos[0], rtol=1e-4):
-            raise ValueError("WMAP Xpos is not same as in ORGN!")
-        y_start = self.__read_type("float")
-        if not numpy.isclose(y_start, self.ypos[0], rtol=1e-4):
-            raise ValueError("WMAP Ypos is not same as in ORGN!")
-        unknown1 = self.__read_type("float")
-        x_pad = self.__read_type("float")
-        y_pad = self.__read_type("float")
-        unknown2 = self.__read_type("float")
-        spectra_w = self.__read_type("int32")
-        spectra_h = self.__read_type("int32")
-
-        # Determine if the xy-grid spacing is same as in x_pad and y_pad
-        if (len(self.xpos) > 1) and (len(self.ypos) > 1):
-            xdist = numpy.abs(self.xpos - self.xpos[0])
-            ydist = numpy.abs(self.ypos - self.ypos[0])
-            xdist = xdist[numpy.nonzero(xdist)]
-            ydist = ydist[numpy.nonzero(ydist)]
-            # Get minimal non-zero padding in the grid
-            try:
-                x_pad_grid = numpy.min(xdist)
-            except ValueError:
-                x_pad_grid = 0
+        curpos = pos + Offsets.wmap_origin
+        x_start = self.__read_type("float", curpos)
+        y_start = self.__read_type("float", curpos + 0x4)
+        unknown1 = self.__read_type("float", curpos + 0x8)
+        x_pad = self.__read_type("float", curpos + 0xC)
+        y_pad = self.__read_type("float", curpos + 0x10)
+        unknown2 = self.__read_type("float", curpos + 0x14)
+        spectra_w = self.__read_type("int32", curpos + 0x18)
+        spectra_h = self.__read_type("int32", curpos + 0x1C)
 
-            try:
-                y_pad_grid = numpy.min(ydist)
-            except ValueError:
-                y_pad_grid = 0
+        # Only the ORGN column headers and first positions are read,
+        # not the whole columns
+        units = {}
+        first = {DataType.Spatial_X: 0.0, DataType.Spatial_Y: 0.0}
+        if "ORGN" in self.block_info:
+            uid, pos, size = self.block_info["ORGN"]
+            list_increment = (
+                Offsets.origin_increment + LenType.l_double.value * self.capacity
+            )
+            for i, header in enumerate(self.read_origin_header()):
+                units[header[1]] = header[2]
+                if (header[1] in first) and (self.count > 0):
+                    curpos = pos + Offsets.origin_info + i * list_increment
+                    curpos += Offsets.origin_increment
+                    first[header[1]] = self.__read_type("double", curpos)
+        # No position to compare with before the first spectrum
+        if self.count > 0:
+            if not numpy.isclose(x_start, first[DataType.Spatial_X], rtol=1e-4):
+                raise ValueError("WMAP Xpos is not same as in ORGN!")
+            if not numpy.isclose(y_start, first[DataType.Spatial_Y], rtol=1e-4):
+                raise ValueError("WMAP Ypos is not same as in ORGN!")
 
         self.map_shape = (spectra_w, spectra_h)
         self.map_info = dict(
@@ -419,14 +956,15 @@ class WDFReader(object):
             y_pad=y_pad,
             x_span=spectra_w * x_pad,
             y_span=spectra_h * y_pad,
-            x_unit=self.xpos_unit,
-            y_unit=self.ypos_unit,
+            x_unit=units.get(DataType.Spatial_X, None),
+            y_unit=units.get(DataType.Spatial_Y, None),
         )
 
     def _parse_img(self):
         """Extract the white-light JPEG image
         The size of while-light image is coded in its EXIF
-        Use PIL to parse the EXIF information
+        Use PIL to parse the EXIF information. Only the JPEG headers
+        are read here, pixels are decoded on demand by get_img()
         """
         try:
             uid, pos, size = self.block_info["WHTL"]
@@ -435,17 +973,17 @@ class WDFReader(object):
                 print("The wdf file does not contain an image", file=stderr)
             return
 
-        # Read the bytes. `self.img` is a wrapped IO object mimicking a file
-        self.file_obj.seek(pos + Offsets.jpeg_header)
-        img_bytes = self.file_obj.read(size - Offsets.jpeg_header)
-        self.img = io.BytesIO(img_bytes)
+        self.img = self.__read_img()
         # Handle image dimension if PIL is present
         if PIL is not None:
+            # Lazy open, reads the headers without decoding the pixels
             pil_img = Image.open(self.img)
+            self._img_size = pil_img.size
             # Weird missing header keys when Pillow >= 8.2.0.
             # see https://pillow.readthedocs.io/en/stable/releasenotes/8.2.0.html#image-getexif-exif-and-gps-ifd
             # Use fall-back _getexif method instead
             exif_header = dict(pil_img._getexif())
+            self.img.seek(0)
             try:
                 # Get the width and height of image
                 w_ = exif_header[ExifTags.FocalPlaneXResolution]
@@ -483,6 +1021,39 @@ class WDFReader(object):
                     )
         return
 
+    def __read_img(self):
+        """Read the JPEG bytes of WHTL into a wrapped IO object mimicking a file"""
+        uid, pos, size = self.block_info["WHTL"]
+        img_bytes = self._source.read(
+            pos + Offsets.jpeg_header, size - Offsets.jpeg_header
+        )
+        return io.BytesIO(img_bytes)
+
+    def get_img(self, size=None):
+        """Get the decoded white-light image as PIL.Image
+
+        Args:
+        size (int, int) : If given, decode at reduced resolution using the
+                          JPEG draft mode (scale 1/2, 1/4 or 1/8), keeping
+                          the image at least as large as size (width, height).
+                          Useful for thumbnails
+
+        The full-resolution image is decoded once and cached,
+        reduced-resolution images are decoded at each call.
+        """
+        if PIL is None:
+            raise ImportError("Pillow is needed to decode the white-light image!")
+        if (size is None) and (self._img_decoded is not None):
+            return self._img_decoded
+        # Use a separate file object, so that `img` can still be read
+        pil_img = Image.open(io.BytesIO(self.img.getvalue()))
+        if size is not None:
+            pil_img.draft("RGB", tuple(size))
+        pil_img.load()
+        if size is None:
+            self._img_decoded = pil_img
+        return pil_img
+
     def __calc_crop_box(self):
         """Helper function to calculate crop box"""
 
@@ -491,11 +1062,10 @@ class WDFReader(object):
             min, max = minmax
             return int(pixels * (x - min) / (max - min))
 
-        pil_img = PIL.Image.open(self.img)
         w_, h_ = self.img_dimensions
         x0_, y0_ = self.img_origins
-        pw = pil_img.width
-        ph = pil_img.height
+        # Pixel size from the JPEG header read in _parse_img
+        pw, ph = self._img_size
         map_xl = self.xpos.min()
         map_xr = self.xpos.max()
         map_yt = self.ypos.min()
@@ -506,8 +1076,10 @@ class WDFReader(object):
         bottom = _proportion(map_yb, (y0_, y0_ + h_), ph)
         return (left, top, right, bottom)
 
-    def __reshape_spectra(self):
-        """Reshape spectra into w * h * self.point_per_spectrum"""
+    def __reshape_spectra(self, spectra):
+        """Reshape spectra into w * h * self.point_per_spectrum
+        Return the reshaped array, or the original one if not possible
+        """
         if not self.is_completed:
             if self.debug:
                 print(
@@ -518,13 +1090,11 @@ class WDFReader(object):
                     file=stderr,
                 )
             try:
-                self.spectra = numpy.reshape(
-                    self.spectra, (self.count, self.point_per_spectrum)
-                )
+                spectra = numpy.reshape(spectra, (self.count, self.point_per_spectrum))
             except ValueError:
                 if self.debug:
                     print("Reshaping spectra array failed. Please check.", file=stderr)
-            return
+            return spectra
         elif hasattr(self, "map_shape"):
             # Is a mapping
             spectra_w, spectra_h = self.map_shape
@@ -538,8 +1108,8 @@ class WDFReader(object):
                         ),
                         file=stderr,
                     )
-                return
-            elif spectra_w * spectra_h * self.point_per_spectrum != len(self.spectra):
+                return spectra
+            elif spectra_w * spectra_h * self.point_per_spectrum != len(spectra):
                 if self.debug:
                     print(
                         (
@@ -549,27 +1119,24 @@ class WDFReader(object):
                         ),
                         file=stderr,
                     )
-                return
+                return spectra
             else:
                 # Should be h rows * w columns. numpy.ndarray is row first
                 # Reshape to 3D matrix when doing 2D mapping
                 if (spectra_h > 1) and (spectra_w > 1):
-                    self.spectra = numpy.reshape(
-                        self.spectra, (spectra_h, spectra_w, self.point_per_spectrum)
+                    spectra = numpy.reshape(
+                        spectra, (spectra_h, spectra_w, self.point_per_spectrum)
                     )
                 # otherwise it is a line scan
                 else:
-                    self.spectra = numpy.reshape(
-                        self.spectra, (self.count, self.point_per_spectrum)
+                    spectra = numpy.reshape(
+                        spectra, (self.count, self.point_per_spectrum)
                     )
         # For any other type of measurement, reshape into (counts, point_per_spectrum)
         # example: series scan
         elif self.count > 1:
-            self.spectra = numpy.reshape(
-                self.spectra, (self.count, self.point_per_spectrum)
-            )
-        else:
-            return
+            spectra = numpy.reshape(spectra, (self.count, self.point_per_spectrum))
+        return spectra
 
     def print_info(self, **params):
         """Print information of the wdf file"""
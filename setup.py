@@ -47,7 +47,10 @@ setup(
         "Programming Language :: Python :: 3.10",
     ],
     entry_points={
-        "console_scripts": ["wdf-export=renishawWiRE.export:main"],
+        "console_scripts": [
+            "wdf-export=renishawWiRE.export:main",
+            "wdf-ingest=renishawWiRE.ingest:main",
+        ],
     },
     python_requires=">=3.6",
 )